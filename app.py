@@ -1,38 +1,64 @@
 import streamlit as st
-from scheduler import generate_exam_dates, generate_schedule, build_supervisor_table
-from pdf_utils import generate_duty_pdf, combine_pdfs_bytes, generate_combined_duty_pdf
 import inspect
-import importlib
+import functools
 
 
-def _call_pdf_compat(func, supervisor_name, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes=None, uni_logo_bytes=None, sign_bytes=None):
+# The helper modules are imported on first use rather than at startup: pdf_utils pulls in ReportLab and
+# email_utils smtplib, which most reruns (configuring blocks, marking attendance) never touch.
+# After the first call the import is just a sys.modules lookup.
+def _scheduler():
+    import scheduler
+    return scheduler
+
+
+def _pdf_utils():
+    import pdf_utils
+    return pdf_utils
+
+
+def _email_utils():
+    import email_utils
+    return email_utils
+
+
+@functools.lru_cache(maxsize=None)
+def _optional_params(func):
+    """Return the optional kwargs (images, page count, assignment index) supported by func; the signature is static so inspect it once per process."""
+    params = inspect.signature(func).parameters
+    return tuple(p for p in ('college_logo_bytes', 'uni_logo_bytes', 'sign_bytes', 'return_page_count', 'assignment_index') if p in params)
+
+
+def _pdf_page_count(pdf_bytes):
+    """Page count of a PDF, or None if no reader is installed or the bytes can't be parsed."""
+    if PdfReader is None:
+        return None
+    try:
+        return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+    except Exception:
+        return None
+
+
+def _call_pdf_compat(func, supervisor_name, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes=None, uni_logo_bytes=None, sign_bytes=None, return_page_count=False, assignment_index=None):
     """Call a PDF function (generate_duty_pdf or generate_combined_duty_pdf) with only the optional kwargs it supports.
     This avoids TypeError when older deployed versions of pdf_utils have fewer parameters.
+    With return_page_count, returns (bytes, page_count); the count comes from the generator when it supports it,
+    otherwise from parsing the PDF.
     """
-    sig = inspect.signature(func)
-    supported = {}
-    if 'college_logo_bytes' in sig.parameters:
-        supported['college_logo_bytes'] = college_logo_bytes
-    if 'uni_logo_bytes' in sig.parameters:
-        supported['uni_logo_bytes'] = uni_logo_bytes
-    if 'sign_bytes' in sig.parameters:
-        supported['sign_bytes'] = sign_bytes
-    return func(supervisor_name, schedule_df, staff_df, start_date, end_date, exam_type, **supported)
+    values = {'college_logo_bytes': college_logo_bytes, 'uni_logo_bytes': uni_logo_bytes, 'sign_bytes': sign_bytes, 'return_page_count': return_page_count, 'assignment_index': assignment_index}
+    supported = {p: values[p] for p in _optional_params(func)}
+    result = func(supervisor_name, schedule_df, staff_df, start_date, end_date, exam_type, **supported)
+    if return_page_count and not isinstance(result, tuple):
+        return result, _pdf_page_count(result)
+    return result
 
 
 def _call_memo_compat(func, supervisor_name, absences, staff_df, college_logo_bytes=None, uni_logo_bytes=None, sign_bytes=None):
     """Call a memo PDF function with only the optional kwargs it supports (backwards compatible)."""
-    sig = inspect.signature(func)
-    supported = {}
-    if 'college_logo_bytes' in sig.parameters:
-        supported['college_logo_bytes'] = college_logo_bytes
-    if 'uni_logo_bytes' in sig.parameters:
-        supported['uni_logo_bytes'] = uni_logo_bytes
-    if 'sign_bytes' in sig.parameters:
-        supported['sign_bytes'] = sign_bytes
+    values = {'college_logo_bytes': college_logo_bytes, 'uni_logo_bytes': uni_logo_bytes, 'sign_bytes': sign_bytes}
+    supported = {p: values[p] for p in _optional_params(func) if p in values}
     return func(supervisor_name, absences, staff_df, **supported)
-from email_utils import send_email_with_attachment
 import pandas as pd
+import numpy as np
 import io
 import datetime
 import os
@@ -40,84 +66,244 @@ import subprocess
 import sys
 import json
 import ast
+import hashlib
+import mmap
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+import xlsxwriter
+# PdfReader validates generated PDFs and counts pages; pypdf preferred, PyPDF2 as fallback
+try:
+    from pypdf import PdfReader
+except ImportError:
+    try:
+        from PyPDF2 import PdfReader
+    except ImportError:
+        PdfReader = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _iso_keys(obj):
+    # stdlib json only accepts str keys; date keys become ISO strings, as orjson writes them
+    if isinstance(obj, dict):
+        return {k.isoformat() if isinstance(k, datetime.date) else k: _iso_keys(v) for k, v in obj.items()}
+    return obj
+
+
+def _dump_json(obj, path):
+    """Write obj to path as UTF-8 JSON, using orjson when it is installed.
+    Dict keys may be datetime.date; they are written as ISO strings either way.
+    """
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(_iso_keys(obj), f, ensure_ascii=False)
+
+
+def _load_json(path):
+    """Read a JSON file in one binary read, parsing with orjson when it is installed."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 def save_attendance_state(att_map):
     try:
-        with open("attendance_state.json", "w", encoding="utf-8") as f:
-            json.dump(att_map, f, ensure_ascii=False)
+        _dump_json(att_map, "attendance_state.json")
     except Exception:
         st.warning("Unable to persist attendance state to disk; attendance may be lost on refresh.")
 
 
+@st.cache_data(show_spinner=False)
+def _load_att(path, mtime):
+    # mtime only keys the cache so a re-saved file is picked up
+    return _load_json(path)
+
+
 def load_attendance_state():
-    if os.path.exists("attendance_state.json"):
-        try:
-            with open("attendance_state.json", "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
+    try:
+        return _load_att("attendance_state.json", os.path.getmtime("attendance_state.json"))
+    except Exception:
+        return {}
+
+
+@st.cache_data(show_spinner=False)
+def _load_staff_df(path, mtime):
+    # mtime only keys the cache so a re-uploaded file is picked up
+    return pd.read_csv(path, header=0)
+
+
+@st.cache_data(show_spinner=False)
+def _email_column(staff_df):
+    """Return the first staff column holding an email-like value ('@' and '.'), or None.
+    Detected once per staff list instead of stringifying every column of a row per recipient.
+    """
+    for c in staff_df.columns:
+        vals = staff_df[c].astype(str)
+        if (vals.str.contains("@", regex=False) & vals.str.contains(".", regex=False)).any():
+            return c
+    return None
+
+
+@st.cache_data(show_spinner=False)
+def _email_map(staff_df):
+    """Map each staff name to the email of its first row; names without an email-like value are left out."""
+    email_col = _email_column(staff_df)
+    if email_col is None:
+        return {}
+    names = staff_df.iloc[:, 1].astype(str).str.strip()
+    emails = staff_df[email_col].astype(str).str.strip()
+    first = ~names.duplicated()
+    valid = emails.str.contains("@", regex=False) & emails.str.contains(".", regex=False)
+    return dict(zip(names[first & valid], emails[first & valid]))
+
+
+@st.cache_data(show_spinner=False)
+def _read_bytes(path, mtime):
+    # mtime only keys the cache; unchanged files are served from memory on reruns
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _collect_absences(absentee_map, d, info):
+    """Add (date, session) to absentee_map[name] for everyone assigned on d but not marked present."""
+    for session in ("Morning", "Evening"):
+        # Set lookups for the present names; iterating the assigned list keeps the memo order stable
+        present = set(info[f"{session}_present"])
+        for name in info[f"{session}_assigned"]:
+            if name not in present:
+                absentee_map.setdefault(name, []).append((d, session))
+
+
+def _sign_hash(sign_bytes):
+    return hashlib.blake2b(sign_bytes, digest_size=16).hexdigest() if sign_bytes else None
+
+
+@st.cache_data(show_spinner=False)
+def _absence_memo(name, absences, sign_hash, issued, _staff_df, _sign_bytes):
+    """Memo PDF bytes for one supervisor, rebuilt only when the name, absences, signature or issue date change.
+    absences is a tuple of (ISO date, session) pairs so it can be hashed; the underscored arguments are
+    not hashed (sign_hash stands in for the signature, and the memo does not read the staff list).
+    """
+    absences = [(datetime.date.fromisoformat(d), sess) for d, sess in absences]
+    return _call_memo_compat(_pdf_utils().generate_absence_memo, name, absences, _staff_df, None, None, _sign_bytes)
+
+
+def _memo_pdf(name, absences, staff_df, sign_bytes, sign_hash):
+    # The memo is stamped with today's date, so that is part of the cache key too
+    key = tuple((d.isoformat(), sess) for d, sess in absences)
+    return _absence_memo(name, key, sign_hash, datetime.date.today(), staff_df, sign_bytes)
 
 
 def save_schedule_state(df, meta: dict):
     try:
-        # Convert dates to ISO strings so JSON is safe
-        temp = df.copy()
-        if 'date' in temp.columns:
-            temp['date'] = temp['date'].apply(lambda d: d.isoformat() if not pd.isnull(d) else None)
-        records = temp.to_dict(orient='records')
-        payload = {'meta': meta, 'records': records}
-        with open('schedule_state.json', 'w', encoding='utf-8') as f:
-            json.dump(payload, f, ensure_ascii=False)
-        # Also save a pickle for more robust reloading (preserves lists, dtypes)
-        try:
-            df.to_pickle('schedule_state.pkl')
-            with open('schedule_meta.json', 'w', encoding='utf-8') as mf:
-                json.dump(meta, mf, ensure_ascii=False)
-        except Exception:
-            # non-fatal, JSON remains
-            pass
-        # Also write a CSV backup for easy manual restore/download
+        # Parquet is the canonical on-disk format: columnar, compressed and it keeps
+        # the assigned lists and date values without a JSON round-trip
         try:
-            df.to_csv('schedule_state.csv', index=False)
+            df.to_parquet('schedule_state.parquet', engine='pyarrow', compression='zstd', index=False)
         except Exception:
-            pass
+            # pyarrow missing or a column it cannot encode: fall back to pickle (preserves lists, dtypes)
+            df.to_pickle('schedule_state.pkl', protocol=5)
+            try:
+                os.remove('schedule_state.parquet')
+            except FileNotFoundError:
+                pass
+        _dump_json(meta, 'schedule_meta.json')
+        # CSV backups are serialized on demand from memory (sidebar download), not on every save
     except Exception:
         st.warning('Unable to persist schedule to disk; schedule may be lost on refresh.')
 
 
+def _load_schedule_meta():
+    try:
+        return _load_json('schedule_meta.json')
+    except Exception:
+        return {}
+
+
+SCHEDULE_STATE_FILES = ('schedule_state.parquet', 'schedule_state.pkl', 'schedule_state.json')
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
 def load_schedule_state():
-    # Prefer pickle (more robust), fall back to JSON
-    if os.path.exists('schedule_state.pkl'):
-        try:
-            df = pd.read_pickle('schedule_state.pkl')
-            meta = {}
-            try:
-                with open('schedule_meta.json', 'r', encoding='utf-8') as mf:
-                    meta = json.load(mf)
-            except Exception:
-                meta = {}
-            return df, meta
-        except Exception:
-            # Try JSON fallback
-            pass
+    # Cached on the persisted files' mtimes so reruns don't re-read and re-parse them
+    return _read_schedule_state(tuple(_mtime(p) for p in SCHEDULE_STATE_FILES + ('schedule_meta.json',)))
 
-    if os.path.exists('schedule_state.json'):
-        try:
-            with open('schedule_state.json', 'r', encoding='utf-8') as f:
-                payload = json.load(f)
-            records = payload.get('records', [])
-            if not records:
-                return None, None
-            df = pd.DataFrame(records)
-            if 'date' in df.columns:
-                df['date'] = pd.to_datetime(df['date']).dt.date
-            meta = payload.get('meta', {})
-            return df, meta
-        except Exception:
+
+@st.cache_data(show_spinner=False)
+def _read_schedule_state(mtimes):
+    # mtimes only keys the cache.
+    # Prefer Parquet, then the legacy pickle, then the legacy JSON; a missing file just falls through
+    try:
+        df = pd.read_parquet('schedule_state.parquet', engine='pyarrow')
+        # pyarrow hands list columns back as numpy arrays; the app expects plain lists
+        if 'assigned' in df.columns:
+            df['assigned'] = df['assigned'].map(lambda v: [] if v is None else list(v))
+        return df, _load_schedule_meta()
+    except Exception:
+        pass
+
+    try:
+        # Unpickle straight from a read-only memory map instead of reading the file into a bytes copy first
+        with open('schedule_state.pkl', 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            df = pickle.load(mm)
+        return df, _load_schedule_meta()
+    except Exception:
+        # Try JSON fallback
+        pass
+
+    try:
+        payload = _load_json('schedule_state.json')
+        records = payload.get('records', [])
+        if not records:
             return None, None
-    return None, None
+        # Legacy files carry no column list; the first record's keys hold the original column order.
+        # Passing columns explicitly skips from_records' per-dict key discovery
+        columns = payload.get('columns') or list(records[0])
+        df = pd.DataFrame.from_records(records, columns=columns)
+        if 'date' in df.columns:
+            # Dates were written with isoformat()
+            df['date'] = pd.to_datetime(df['date'], format='ISO8601', errors='coerce').dt.date
+        meta = payload.get('meta', {})
+        return df, meta
+    except Exception:
+        return None, None
+
+
+# Column name fragments (lowercase) recognised for each schedule key, in priority order
+SCHEDULE_COLUMN_ALIASES = {
+    'date': ('date',),
+    'session': ('session', 'time', 'shift'),
+    'assigned': ('assign', 'invigil', 'supervisor', 'name'),
+}
+
+
+# df.attrs marker for schedules already in the {date, session, assigned} schema (set on generation;
+# Parquet and pickle persistence keep attrs, so reloaded schedules carry it too)
+CANONICAL_SCHEMA = 'canonical'
+
+
+def _is_canonical(df):
+    return df is not None and df.attrs.get('schema_version') == CANONICAL_SCHEMA
+
+
+def _hash_schedule(df):
+    """Content hash for st.cache_data: the list-valued 'assigned' column defeats pandas' own row hashing,
+    so values are hashed through their string form (column names included).
+    """
+    return tuple(map(str, df.columns)), pd.util.hash_pandas_object(df.astype(str), index=True).to_numpy().tobytes()
 
 
 def ensure_schedule_schema(df):
@@ -127,115 +313,103 @@ def ensure_schedule_schema(df):
     """
     if df is None or df.empty:
         return None
+    if _is_canonical(df):
+        return df
+    return _normalize_schedule(df)
+
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hash_schedule})
+def _normalize_schedule(df):
+    # Cached on the DataFrame contents since it runs several times per rerun on the same schedule
+
+    # Already normalized (e.g. freshly generated or loaded from Parquet): nothing to rename or parse
+    if {'date', 'session', 'assigned'}.issubset(df.columns) and not df.columns.duplicated().any():
+        if df['date'].map(type).eq(datetime.date).all() and df['assigned'].map(type).eq(list).all():
+            return df
 
     df = df.copy()
 
-    # Normalize column names (case-insensitive mapping)
-    cols = {c.lower(): c for c in df.columns}
-    # date
-    if 'date' not in cols:
-        # try common variants
-        for candidate in ['Date', 'DATE']:
-            if candidate in df.columns:
-                df = df.rename(columns={candidate: 'date'})
-                cols['date'] = 'date'
-                break
-        # try any column whose lower() == 'date'
-        if 'date' not in cols:
-            for c in df.columns:
-                if c.strip().lower() == 'date':
-                    df = df.rename(columns={c: 'date'})
-                    cols['date'] = 'date'
-                    break
-
-    if 'date' in cols:
-        try:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.date
-        except Exception:
-            pass
-    else:
+    # Normalize column names in one pass: for each missing key prefer an exact (case/whitespace-insensitive)
+    # name, then the first column matching one of its aliases; rename once
+    lowered = {c: str(c).strip().lower() for c in df.columns}
+    rename = {}
+    for key, aliases in SCHEDULE_COLUMN_ALIASES.items():
+        if key in df.columns:
+            continue
+        free = [c for c in df.columns if c not in rename and c not in SCHEDULE_COLUMN_ALIASES]
+        match = next((c for c in free if lowered[c] == key), None)
+        if match is None:
+            match = next((c for c in free if any(a in lowered[c] for a in aliases)), None)
+        if match is not None:
+            rename[match] = key
+    if rename:
+        df = df.rename(columns=rename)
+
+    # date and session are required; without them the schedule can't be placed
+    if 'date' not in df.columns or 'session' not in df.columns:
         return None
+    try:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.date
+    except Exception:
+        pass
 
-    # session
-    if 'session' not in cols:
-        for c in df.columns:
-            if c.strip().lower() == 'session':
-                df = df.rename(columns={c: 'session'})
-                cols['session'] = 'session'
-                break
-    if 'session' not in cols:
-        # If session column missing, try to infer based on 'time' or create default
-        if 'time' in (c.lower() for c in df.columns):
-            for c in df.columns:
-                if c.lower() == 'time':
-                    df = df.rename(columns={c: 'session'})
-                    cols['session'] = 'session'
-                    break
-        else:
-            # Can't reliably infer session; bail
-            return None
-
-    # assigned
-    if 'assigned' not in cols:
-        for c in df.columns:
-            if c.strip().lower() == 'assigned':
-                df = df.rename(columns={c: 'assigned'})
-                cols['assigned'] = 'assigned'
-                break
-    if 'assigned' not in cols:
-        # maybe assignments were stored in a column like 'Assigned' or 'assigned_to'
-        for c in df.columns:
-            if 'assign' in c.strip().lower():
-                df = df.rename(columns={c: 'assigned'})
-                cols['assigned'] = 'assigned'
-                break
-
-    if 'assigned' in cols:
-        # Ensure assigned are lists; parse string reprs
-        def _parse_assigned(v):
-            if v is None:
-                return []
-            if isinstance(v, list):
-                return v
-            if isinstance(v, (float, int)) and pd.isna(v):
+    if 'assigned' in df.columns:
+        # Ensure assigned are lists; parse string reprs.
+        # Lists and comma separated strings are handled column-wise; only strings that
+        # look like a list literal ("['A', 'B']") go through ast.literal_eval.
+        def _split_names(parts):
+            return [x.strip() for x in parts if x.strip()]
+
+        def _parse_literal(s):
+            try:
+                val = ast.literal_eval(s)
+                if isinstance(val, list):
+                    return [str(x) for x in val]
+            except Exception:
+                pass
+            return _split_names(s.split(','))
+
+        def _parse_other(v):
+            if v is None or (isinstance(v, (float, int)) and pd.isna(v)):
                 return []
-            if isinstance(v, str):
-                s = v.strip()
-                # try literal_eval for list-like strings
-                try:
-                    val = ast.literal_eval(s)
-                    if isinstance(val, list):
-                        return [str(x) for x in val]
-                except Exception:
-                    # fallback: comma separated
-                    if ',' in s:
-                        return [x.strip() for x in s.split(',') if x.strip()]
-                    if s == '':
-                        return []
-                    return [s]
             return [v]
 
-        df['assigned'] = df['assigned'].apply(_parse_assigned)
+        assigned = df['assigned'].reset_index(drop=True)
+        kinds = assigned.map(type)
+        strs = assigned[kinds.eq(str)].astype(object).str.strip()
+        is_literal = strs.str.startswith('[')
+        parsed = pd.concat([
+            assigned[kinds.eq(list)],
+            strs[is_literal].map(_parse_literal),
+            strs[~is_literal].str.split(',').map(_split_names),
+            assigned[~kinds.isin([list, str])].map(_parse_other),
+        ]).sort_index()
+        df['assigned'] = pd.Series(parsed.to_numpy(dtype=object), index=df.index)
     else:
         return None
 
     return df
 
 
+def _assigned_lookup(schedule_df):
+    """Map (date, session) to that slot's assigned list, built once instead of masking the frame per lookup.
+    Keeps the first row for a repeated slot, as the per-date filters did with iloc[0].
+    """
+    slots = schedule_df.drop_duplicates(["date", "session"])
+    return dict(zip(zip(slots["date"], slots["session"]), slots["assigned"]))
+
+
 def _map_common_schedule_columns(df):
     """Try to map common column name variants to the expected schema keys."""
-    if df is None or df.empty:
+    if df is None or df.empty or _is_canonical(df):
         return df
     rename = {}
     for c in df.columns:
         lc = c.strip().lower()
-        if 'date' in lc or 'exam date' in lc or 'date of' in lc:
-            rename[c] = 'date'
-        elif lc in ('session', 'time', 'shift') or 'session' in lc or 'time' in lc or 'shift' in lc:
-            rename[c] = 'session'
-        elif 'assign' in lc or 'invigil' in lc or 'supervisor' in lc or 'name' in lc:
-            # careful: avoid renaming 'Name of Faculty' to 'assigned' incorrectly when schedule horizontal format is used; only map if column seems to contain multiple names
-            rename[c] = 'assigned'
+        # careful: avoid renaming 'Name of Faculty' to 'assigned' incorrectly when schedule horizontal format is used; only map if column seems to contain multiple names
+        key = next((k for k, aliases in SCHEDULE_COLUMN_ALIASES.items() if any(a in lc for a in aliases)), None)
+        if key is not None:
+            rename[c] = key
     if rename:
         try:
             return df.rename(columns=rename)
@@ -252,7 +426,7 @@ def _resolve_duplicate_columns(df):
     For any other duplicated column, pick the first non-null value.
     """
     import collections
-    if df is None or df.empty:
+    if df is None or df.empty or _is_canonical(df):
         return df
 
     # First make duplicate column names unique by appending a suffix so we can address them individually
@@ -280,75 +454,50 @@ def _resolve_duplicate_columns(df):
         if len(originals) <= 1:
             continue
         # Merge depending on key
+        block = out[originals]
+        # Blank strings count as missing so the first real value wins
+        present = block.replace(r'^\s*$', np.nan, regex=True)
         if low == 'assigned':
-            def merge_assigned(row):
-                vals = []
-                for c in originals:
-                    v = row.get(c)
-                    if pd.isna(v) or v is None:
-                        continue
-                    # reuse ensure_schedule_schema parsing logic (simple):
-                    if isinstance(v, list):
-                        vals.extend([str(x) for x in v])
-                    else:
-                        s = str(v).strip()
-                        if s.startswith('[') and s.endswith(']'):
-                            try:
-                                arr = ast.literal_eval(s)
-                                if isinstance(arr, list):
-                                    vals.extend([str(x) for x in arr])
-                                    continue
-                            except Exception:
-                                pass
-                        if ',' in s:
-                            vals.extend([x.strip() for x in s.split(',') if x.strip()])
-                        elif s:
-                            vals.append(s)
-                # unique preserve order
-                seen = set()
-                out_list = []
-                for x in vals:
-                    if x not in seen:
-                        seen.add(x)
-                        out_list.append(x)
-                return out_list
-
-            out['assigned'] = out.apply(merge_assigned, axis=1)
+            # Long form (one cell per row/column pair, in column order), parse, then regroup per row
+            long = present.reset_index(drop=True).melt(value_name='v', ignore_index=False)
+            rows = pd.Series(long.index, index=pd.RangeIndex(len(long)))
+            cells = pd.Series(long['v'].to_numpy(dtype=object), index=rows.index)
+            cells = cells[cells.notna()]
+            is_list = cells.map(type).eq(list)
+            strs = cells[~is_list].astype(str).str.strip()
+            is_literal = strs.str.startswith('[') & strs.str.endswith(']')
+
+            def _parse_literal(s):
+                try:
+                    arr = ast.literal_eval(s)
+                    if isinstance(arr, list):
+                        return arr
+                except Exception:
+                    pass
+                return s.split(',')
+
+            parts = pd.concat([
+                cells[is_list],
+                strs[is_literal].map(_parse_literal),
+                strs[~is_literal].str.split(','),
+            ]).sort_index()
+            names = parts.explode().dropna().astype(str).str.strip()
+            names = names[names.ne('')]
+            # unique preserve order
+            merged = names.groupby(rows[names.index].to_numpy()).agg(lambda xs: list(dict.fromkeys(xs)))
+            out['assigned'] = pd.Series([merged.get(i, []) for i in range(len(out))], index=out.index, dtype=object)
         elif low == 'date':
-            # pick first non-null and coerce to date
-            def pick_date(row):
-                for c in originals:
-                    v = row.get(c)
-                    if pd.isna(v) or v is None or str(v).strip() == '':
-                        continue
-                    try:
-                        return pd.to_datetime(v).date()
-                    except Exception:
-                        continue
-                return None
-
-            out['date'] = out.apply(pick_date, axis=1)
+            # pick first value that parses, coerced to date
+            parsed = pd.concat([pd.to_datetime(present[c], errors='coerce', format='mixed') for c in originals], axis=1)
+            first = parsed.bfill(axis=1).iloc[:, 0]
+            out['date'] = first.dt.date.astype(object).where(first.notna(), None)
         elif low == 'session':
-            def pick_session(row):
-                for c in originals:
-                    v = row.get(c)
-                    if pd.isna(v) or v is None or str(v).strip() == '':
-                        continue
-                    return str(v).strip()
-                return None
-
-            out['session'] = out.apply(pick_session, axis=1)
+            first = present.bfill(axis=1).iloc[:, 0]
+            out['session'] = first.astype(str).str.strip().astype(object).where(first.notna(), None)
         else:
             # generic: pick first non-null
-            def pick_first(row):
-                for c in originals:
-                    v = row.get(c)
-                    if pd.isna(v) or v is None or str(v).strip() == '':
-                        continue
-                    return v
-                return None
-
-            out[low] = out.apply(pick_first, axis=1)
+            first = present.bfill(axis=1).iloc[:, 0]
+            out[low] = first.astype(object).where(first.notna(), None)
 
         # drop other original columns except the standardized one we created
         for c in originals:
@@ -360,6 +509,164 @@ def _resolve_duplicate_columns(df):
 
     return out
 
+def _read_schedule_csv(upload):
+    """Read an uploaded schedule CSV with pyarrow's multithreaded reader, falling back to pandas."""
+    try:
+        import pyarrow.csv as pacsv
+        return pacsv.read_csv(io.BytesIO(upload.getvalue())).to_pandas()
+    except Exception:
+        upload.seek(0)
+        return pd.read_csv(upload, header=0)
+
+
+def _upload_bytes(upload, key):
+    """Return the bytes of an uploaded file, read once per upload and stashed in st.session_state[key]."""
+    if upload is None:
+        return None
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] != upload.file_id:
+        cached = (upload.file_id, upload.getvalue())
+        st.session_state[key] = cached
+    return cached[1]
+
+
+def get_day_blocks(week_day_keys):
+    """Build the scheduler's day_blocks from the week/day number_input widget state.
+    week_day_keys is a list of (week_day_key, week_idx); widgets are keyed '<week_day_key>_morning' / '_evening'.
+    """
+    return {
+        key: {
+            "morning": st.session_state[f"{key}_morning"],
+            "evening": st.session_state[f"{key}_evening"],
+            "week_number": week_idx
+        }
+        for key, week_idx in week_day_keys
+    }
+
+
+def _parse_holidays(text):
+    """Parse comma separated YYYY-MM-DD dates in one pass; a malformed entry is skipped rather than discarding the whole list."""
+    raw = pd.Series([d.strip() for d in text.split(",") if d.strip()], dtype=object)
+    return pd.to_datetime(raw, format="%Y-%m-%d", errors="coerce").dropna().dt.date.tolist()
+
+
+def _parse_special_blocks(text):
+    """Parse 'YYYY-MM-DD:blocks' lines into {date: blocks}. Malformed lines are skipped."""
+    lines = pd.Series(text.splitlines(), dtype=object)
+    parts = lines[lines.str.contains(':', regex=False)].str.split(':', n=1, expand=True)
+    if parts.empty:
+        return {}
+    dates = pd.to_datetime(parts[0].str.strip(), format='%Y-%m-%d', errors='coerce')
+    blocks = pd.to_numeric(parts[1].str.strip(), errors='coerce')
+    valid = dates.notna() & blocks.notna() & (blocks % 1 == 0)
+    return dict(zip(dates[valid].dt.date.tolist(), blocks[valid].astype(int).tolist()))
+
+
+def _parse_special_session_blocks(text):
+    """Parse 'YYYY-MM-DD:Morning:blocks,Evening:blocks' lines into {date: {"morning": blocks, "evening": blocks}}.
+    Malformed lines are skipped; a later line for the same date replaces the earlier one.
+    """
+    lines = pd.Series(text.splitlines(), dtype=object)
+    pairs = lines.str.extractall(r'(?i)(morning|evening)\s*:\s*(\d+)')
+    if pairs.empty:
+        return {}
+    dates = pd.to_datetime(lines.str.split(':', n=1).str[0].str.strip(), format='%Y-%m-%d', errors='coerce')
+    line_nos = pairs.index.get_level_values(0)
+    pairs = pairs[dates.reindex(line_nos).notna().to_numpy()]
+    per_line = {}
+    for line_no, session_name, count in zip(pairs.index.get_level_values(0), pairs[0].str.lower(), pairs[1].astype(int).tolist()):
+        per_line.setdefault(line_no, {})[session_name] = count
+    return {dates[line_no].date(): session_data for line_no, session_data in per_line.items()}
+
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hash_schedule})
+def schedule_to_excel_bytes(schedule_df):
+    # Defensive: normalize/validate incoming DataFrame schema
+    safe = ensure_schedule_schema(schedule_df)
+    if safe is None:
+        # Caller will display an error; return None to indicate failure
+        return None
+    schedule_df = safe
+    # Build workbook with merged headers using xlsxwriter for precise formatting.
+    # Formats are registered once on the workbook and rows are written whole with write_row
+    bio = io.BytesIO()
+    wb = xlsxwriter.Workbook(bio, {"in_memory": True})
+    ws = wb.add_worksheet("Schedule")
+    header_fmt = wb.add_format({"bold": True, "align": "center", "valign": "vcenter"})
+    date_fmt = wb.add_format({"bold": True, "align": "center"})
+
+    # Auto-width columns
+    ws.set_column("A:A", 15)
+    ws.set_column("B:B", 25)
+    ws.set_column("C:D", 15)
+
+    # Header rows
+    ws.merge_range("A1:A2", "Sr. No.", header_fmt)
+    ws.merge_range("B1:B2", "Name of Faculty", header_fmt)
+    ws.merge_range("C1:D1", "Date", header_fmt)
+    ws.write_row(1, 2, ["Morning (10.00 a.m. to 01.00 p.m.)", "Evening (02.00 p.m. to 05.00 p.m.)"], header_fmt)
+
+    # Fill data grouped by date (date row as merged label, then supervisors); xlsxwriter rows are 0-based
+    assigned_map = _assigned_lookup(schedule_df)
+    row_idx = 2
+    sr = 1
+    for d in sorted(schedule_df["date"].unique()):
+        # write a date separator row merged across columns A:D
+        ws.merge_range(row_idx, 0, row_idx, 3, d.strftime("%Y-%m-%d"), date_fmt)
+        row_idx += 1
+
+        # Sets once per date: the union gives the row order and the tick checks are hash lookups
+        morning_assigned = set(assigned_map.get((d, "Morning"), []))
+        evening_assigned = set(assigned_map.get((d, "Evening"), []))
+        for name in sorted(morning_assigned | evening_assigned):
+            m_tick = "✓" if name in morning_assigned else ""
+            e_tick = "✓" if name in evening_assigned else ""
+            ws.write_row(row_idx, 0, [sr, name, m_tick, e_tick])
+            row_idx += 1
+            sr += 1
+
+    wb.close()
+    return bio.getvalue()
+
+
+@st.cache_data(show_spinner=False, hash_funcs={pd.DataFrame: _hash_schedule})
+def schedule_to_excel_horizontal(schedule_df):
+    # constant_memory: rows are written in order and flushed as soon as the next row starts
+    bio = io.BytesIO()
+    wb = xlsxwriter.Workbook(bio, {"in_memory": True, "constant_memory": True})
+    ws = wb.add_worksheet("Schedule_Horizontal")
+
+    # Build list of unique dates
+    dates = sorted(schedule_df["date"].unique())
+    # Header row: Sr. No., Name, then for each date two columns (Morning, Evening)
+    headers = ["Sr. No.", "Name of Faculty"]
+    for d in dates:
+        headers.append(d.strftime("%Y-%m-%d") + "\nMorning")
+        headers.append(d.strftime("%Y-%m-%d") + "\nEvening")
+
+    # Adjust column widths
+    ws.set_column(0, len(headers) - 1, 18)
+
+    # Write header
+    ws.write_row(0, 0, headers, wb.add_format({"bold": True, "align": "center", "valign": "vcenter", "text_wrap": True}))
+
+    # Build list of supervisors
+    names = sorted(schedule_df["assigned"].explode().dropna().unique())
+    # Tick matrix in one pass: explode to (slot, name) pairs and crosstab into supervisor x (date, session),
+    # laid out in header order. The first row of a repeated slot wins, as in _assigned_lookup
+    if names:
+        long = schedule_df.drop_duplicates(["date", "session"]).explode("assigned", ignore_index=True).dropna(subset=["assigned"])
+        slots = pd.MultiIndex.from_product([dates, ["Morning", "Evening"]])
+        counts = pd.crosstab(long["assigned"], [long["date"], long["session"]])
+        counts = counts.reindex(index=names, columns=slots, fill_value=0)
+        ticks = np.where(counts.to_numpy() > 0, "✓", "").tolist()
+        for sr, (name, row) in enumerate(zip(names, ticks), start=1):
+            ws.write_row(sr, 0, [sr, name, *row])
+
+    wb.close()
+    return bio.getvalue()
+
+
 st.set_page_config(page_title="Exam Supervision Allotment", layout="wide")
 
 st.title("Supervision Allotment and Duty Orders")
@@ -370,50 +677,50 @@ uploaded = st.sidebar.file_uploader("Upload staff CSV (must contain Name and Mai
 # Persist uploaded staff CSV so it survives refreshes on the server
 PERSISTED_STAFF = os.path.join(os.getcwd(), "staff_uploaded.csv")
 if uploaded is not None:
-    try:
-        # read bytes and persist to disk
-        b = uploaded.getvalue()
-    except Exception:
-        try:
-            uploaded.seek(0)
-            b = uploaded.read()
-        except Exception:
-            b = None
-
-    if b:
+    # Persist each upload once (not on every rerun) straight from the upload buffer,
+    # then parse the file on disk through the cached loader
+    persisted = st.session_state.get("staff_upload_id") == uploaded.file_id
+    if not persisted:
         try:
             with open(PERSISTED_STAFF, "wb") as f:
-                f.write(b)
+                f.write(uploaded.getbuffer())
+            st.session_state["staff_upload_id"] = uploaded.file_id
+            persisted = True
         except Exception:
             st.warning("Unable to persist uploaded staff CSV to disk; data may be lost on refresh.")
 
     try:
-        staff_df = pd.read_csv(io.BytesIO(b), header=0)
-    except Exception:
-        try:
+        if persisted:
+            staff_df = _load_staff_df(PERSISTED_STAFF, os.path.getmtime(PERSISTED_STAFF))
+        else:
+            uploaded.seek(0)
             staff_df = pd.read_csv(uploaded, header=0)
-        except Exception:
-            staff_df = pd.DataFrame(columns=["Sr. No.", "Name of Supervisor", "Mail Id"])
+    except Exception:
+        staff_df = pd.DataFrame(columns=["Sr. No.", "Name of Supervisor", "Mail Id"])
 else:
     # If there is a previously uploaded staff file on disk, prefer it
     if os.path.exists(PERSISTED_STAFF):
         try:
-            staff_df = pd.read_csv(PERSISTED_STAFF, header=0)
+            staff_df = _load_staff_df(PERSISTED_STAFF, os.path.getmtime(PERSISTED_STAFF))
         except Exception:
             staff_df = pd.DataFrame(columns=["Sr. No.", "Name of Supervisor", "Mail Id"])
     else:
         default_path = os.path.join(os.getcwd(), "Staff List Uniform list (1).csv")
         try:
-            staff_df = pd.read_csv(default_path, header=0)
+            staff_df = _load_staff_df(default_path, os.path.getmtime(default_path))
         except Exception:
             staff_df = pd.DataFrame(columns=["Sr. No.", "Name of Supervisor", "Mail Id"])
 
+email_map = _email_map(staff_df)
 st.sidebar.write(f"Loaded {len(staff_df)} supervisors")
 st.sidebar.info("Uploaded staff CSV is persisted to the app storage as 'staff_uploaded.csv' and attendance is auto-saved to 'attendance_state.json' so refresh won't lose data.")
 if st.sidebar.button("Clear persisted schedule"):
     try:
-        if os.path.exists('schedule_state.json'):
-            os.remove('schedule_state.json')
+        for persisted in SCHEDULE_STATE_FILES:
+            try:
+                os.remove(persisted)
+            except FileNotFoundError:
+                pass
         if 'schedule_df' in st.session_state:
             del st.session_state['schedule_df']
         if 'schedule_meta' in st.session_state:
@@ -427,15 +734,10 @@ with st.sidebar.expander("Restore schedule from file"):
     restore_file = st.file_uploader("Upload a schedule CSV to restore", type=["csv"], key="restore_schedule")
     if restore_file is not None:
         try:
-            df_restore = pd.read_csv(restore_file, header=0)
+            df_restore = _read_schedule_csv(restore_file)
             df_restore = _map_common_schedule_columns(df_restore)
             df_restore = _resolve_duplicate_columns(df_restore)
-            # try to parse date column
-            if 'date' in df_restore.columns:
-                try:
-                    df_restore['date'] = pd.to_datetime(df_restore['date']).dt.date
-                except Exception:
-                    pass
+            # ensure_schedule_schema coerces the date column in one vectorized pass
             norm = ensure_schedule_schema(df_restore)
             if norm is None:
                 st.sidebar.error('Uploaded schedule appears malformed: required columns (date, session, assigned) not found or could not be parsed. Please fix the CSV and try again.')
@@ -455,10 +757,7 @@ with col1:
 with col2:
     exclude_weekends = st.checkbox("Skip Sundays only", value=True, help="When checked, exam dates will skip Sundays only (Saturday will be included).")
     holiday_text = st.text_area("Holidays (comma separated YYYY-MM-DD)", help="Enter dates separated by commas")
-    try:
-        holidays = [datetime.datetime.strptime(d.strip(), "%Y-%m-%d").date() for d in holiday_text.split(",") if d.strip()]
-    except Exception:
-        holidays = []
+    holidays = _parse_holidays(holiday_text)
     st.markdown("---")
     st.subheader("SMTP Configuration (for sending emails)")
     smtp_server = st.text_input("SMTP server", value=st.session_state.get("smtp_server", "smtp.gmail.com"))
@@ -488,31 +787,30 @@ st.info("Configure the number of blocks for each day in each week of the exam pe
 
 # Calculate exam dates and organize by weeks
 try:
-    exam_dates = generate_exam_dates(start_date, end_date, exclude_weekends, holidays)
+    # Ordinals are enough to lay out the weeks; the date list is only built when a schedule is generated
+    exam_ords = _scheduler().generate_exam_date_ordinals(start_date, end_date, exclude_weekends, holidays)
     
-    if len(exam_dates) == 0:
+    if len(exam_ords) == 0:
         st.warning("No exam dates found. Please check your date range and holiday settings.")
-        day_blocks = {}
+        week_day_keys = []
     else:
         # Organize exam dates by weeks
         # A week starts on Monday (weekday 0)
         day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
         
-        # Group dates by ISO calendar week
-        weeks_dict = {}  # Format: {(year, week_number): [list of dates in that week]}
-        for d in exam_dates:
-            iso_year, iso_week, iso_weekday = d.isocalendar()
-            week_key = (iso_year, iso_week)
-            if week_key not in weeks_dict:
-                weeks_dict[week_key] = []
-            weeks_dict[week_key].append(d)
+        # Group dates by ISO calendar week in one pass, with per-week weekday counts
+        exam_ts = pd.Series(pd.to_datetime(exam_ords - datetime.date(1970, 1, 1).toordinal(), unit='D'))
+        iso = exam_ts.dt.isocalendar()
+        week_keys = [iso['year'].astype(int), iso['week'].astype(int)]
+        weeks_dict = exam_ts.dt.date.groupby(week_keys).apply(list).to_dict()  # Format: {(year, week_number): [list of dates in that week]}
+        weekday_counts = exam_ts.dt.weekday.groupby(week_keys).value_counts().unstack(fill_value=0).reindex(columns=range(7), fill_value=0)
         
         # Sort weeks chronologically
         sorted_weeks = sorted(weeks_dict.items())
         
         # Display summary
         st.markdown("### Exam Period Summary")
-        st.markdown(f"**Total Exam Days:** {len(exam_dates)} | **Total Weeks:** {len(sorted_weeks)} | **Date Range:** {start_date.strftime('%b %d, %Y')} to {end_date.strftime('%b %d, %Y')}")
+        st.markdown(f"**Total Exam Days:** {len(exam_ords)} | **Total Weeks:** {len(sorted_weeks)} | **Date Range:** {start_date.strftime('%b %d, %Y')} to {end_date.strftime('%b %d, %Y')}")
         if exclude_weekends:
             st.caption("ℹ️ Sundays are excluded from the exam period")
         if holidays:
@@ -520,8 +818,8 @@ try:
         
         st.markdown("---")
         
-        # Create week-wise configuration
-        day_blocks = {}
+        # Create week-wise configuration; values stay in widget state and are read by get_day_blocks()
+        week_day_keys = []  # [(week_day_key, week_idx)]
         
         for week_idx, (week_key, week_dates) in enumerate(sorted_weeks, 1):
             iso_year, iso_week = week_key
@@ -531,10 +829,7 @@ try:
             st.markdown(f"### Week {week_idx} ({week_start.strftime('%b %d')} - {week_end.strftime('%b %d, %Y')})")
             
             # Count which days are in this week
-            week_day_count = {day: 0 for day in day_names}
-            for d in week_dates:
-                day_name = day_names[d.weekday()]
-                week_day_count[day_name] += 1
+            week_day_count = dict(zip(day_names, weekday_counts.loc[week_key].tolist()))
             
             # Show metrics for days present in this week
             summary_cols = st.columns(min(6, sum(1 for c in week_day_count.values() if c > 0)))
@@ -554,34 +849,29 @@ try:
                 if week_day_count[day] > 0:
                     with week_cols[col_idx % 2]:
                         st.markdown(f"**{day}**")
-                        morning_val = st.number_input(
+                        st.number_input(
                             f"Morning blocks", 
                             min_value=0, 
                             max_value=30, 
                             value=2,
                             key=f"week_{iso_week}_{day}_morning"
                         )
-                        evening_val = st.number_input(
+                        st.number_input(
                             f"Evening blocks", 
                             min_value=0, 
                             max_value=30, 
                             value=2,
                             key=f"week_{iso_week}_{day}_evening"
                         )
-                        # Store with ISO week number so it matches scheduler logic
-                        day_blocks[f"week_{iso_week}_{day}"] = {
-                            "morning": morning_val,
-                            "evening": evening_val,
-                            "week_number": week_idx
-                        }
+                        # Key with ISO week number so it matches scheduler logic
+                        week_day_keys.append((f"week_{iso_week}_{day}", week_idx))
                     col_idx += 1
             
             st.markdown("---")
 
 except Exception as e:
     st.error(f"Unable to calculate exam dates: {e}")
-    exam_dates = []
-    day_blocks = {}
+    week_day_keys = []
 
 st.caption("📝 The supervision chart will be generated based on these week-wise day-wise configurations for your exam period.")
 
@@ -595,40 +885,18 @@ if exam_type == "Supplementary":
     st.markdown("**Option 1: Simple (same blocks for both sessions on a date)**")
     st.caption("Format: YYYY-MM-DD:blocks (one per line) - applies same block count to both Morning and Evening")
     special_input = st.text_area("Special dates with blocks (format YYYY-MM-DD:blocks)", height=100, key="special_blocks_simple")
-    for line in special_input.splitlines():
-        if ":" in line:
-            d, b = line.split(":")
-            try:
-                sd = datetime.datetime.strptime(d.strip(), "%Y-%m-%d").date()
-                special_blocks[sd] = int(b.strip())
-            except Exception:
-                pass
+    special_blocks = _parse_special_blocks(special_input)
     
     st.markdown("**Option 2: Detailed (different blocks for Morning and Evening)**")
     st.caption("Format: YYYY-MM-DD:Morning:blocks,Evening:blocks (one per line) - Example: 2026-01-22:Morning:3,Evening:2")
     detailed_input = st.text_area("Special dates with session-wise blocks", height=120, key="special_blocks_detailed")
-    for line in detailed_input.splitlines():
-        if ":" in line and "Morning" in line and "Evening" in line:
-            parts = line.split(":")
-            try:
-                sd = datetime.datetime.strptime(parts[0].strip(), "%Y-%m-%d").date()
-                # Parse Morning:blocks and Evening:blocks
-                session_data = {}
-                for i in range(1, len(parts), 2):
-                    session_name = parts[i].strip().lower()
-                    if i + 1 < len(parts):
-                        block_count = int(parts[i+1].strip().rstrip(','))
-                        session_data[session_name] = block_count
-                if session_data:
-                    special_date_session_blocks[sd] = session_data
-            except Exception:
-                pass
+    special_date_session_blocks = _parse_special_session_blocks(detailed_input)
 
 st.subheader("College/University Logos (Optional)")
 col_logo = st.file_uploader("College logo (left)", type=["png","jpg","jpeg"], key="college_logo")
 uni_logo = st.file_uploader("University logo (right)", type=["png","jpg","jpeg"], key="uni_logo")
-college_logo_bytes = col_logo.read() if col_logo else None
-uni_logo_bytes = uni_logo.read() if uni_logo else None
+college_logo_bytes = _upload_bytes(col_logo, "college_logo_bytes")
+uni_logo_bytes = _upload_bytes(uni_logo, "uni_logo_bytes")
 
 # Try to load a previously generated schedule so attendance is available without regenerating
 if 'schedule_df' not in st.session_state:
@@ -647,7 +915,8 @@ if 'schedule_df' not in st.session_state:
             ts = None
         if not ts:
             try:
-                ts = datetime.datetime.fromtimestamp(os.path.getmtime('schedule_state.pkl' if os.path.exists('schedule_state.pkl') else 'schedule_state.json')).isoformat()
+                persisted = next(p for p in SCHEDULE_STATE_FILES if os.path.exists(p))
+                ts = datetime.datetime.fromtimestamp(os.path.getmtime(persisted)).isoformat()
             except Exception:
                 ts = None
 
@@ -691,17 +960,16 @@ if 'schedule_df' not in st.session_state:
                 st.info('Loaded previously generated schedule from disk; Attendance Marking is populated.')
             else:
                 st.warning("Found a persisted schedule but it appears malformed (missing required columns). Please restore from a CSV or regenerate the schedule.")
-        # make persisted schedule downloadable from sidebar for backup
+        # make persisted schedule downloadable from sidebar for backup (serialized from memory)
         try:
-            if os.path.exists('schedule_state.csv'):
-                with open('schedule_state.csv', 'rb') as f:
-                    csv_bytes = f.read()
-                st.sidebar.download_button('Download persisted schedule (CSV)', data=csv_bytes, file_name='schedule_state.csv', mime='text/csv')
+            csv_bytes = loaded_df.to_csv(index=False).encode('utf-8')
+            st.sidebar.download_button('Download persisted schedule (CSV)', data=csv_bytes, file_name='schedule_state.csv', mime='text/csv')
         except Exception:
             pass
 
 if st.button("Generate Schedule"):
-    exam_dates = generate_exam_dates(start_date, end_date, exclude_weekends, holidays)
+    exam_dates = _scheduler().generate_exam_dates(start_date, end_date, exclude_weekends, holidays)
+    day_blocks = get_day_blocks(week_day_keys)
     
     # Merge special_blocks (simple format) and special_date_session_blocks (detailed format)
     merged_special_blocks = special_blocks.copy()
@@ -710,7 +978,7 @@ if st.button("Generate Schedule"):
     # day_blocks: per-day per-session blocks (Monday morning: 2, Monday evening: 2, etc.)
     # special_blocks: per-date same-count overrides (optional, for Supplementary only)
     # date_session_blocks: per-date per-session overrides (optional, for Supplementary only)
-    schedule_df = generate_schedule(
+    schedule_df = _scheduler().generate_schedule(
         exam_dates, 
         default_blocks=2,  # Fallback if no other config applies
         special_blocks=merged_special_blocks,    # Simple date overrides (both sessions)
@@ -719,6 +987,7 @@ if st.button("Generate Schedule"):
         day_blocks=day_blocks if day_blocks else None,  # Day-of-week per-session blocks
         date_session_blocks=special_date_session_blocks  # Per-date per-session overrides
     )
+    schedule_df.attrs['schema_version'] = CANONICAL_SCHEMA
     
     st.session_state["schedule_df"] = schedule_df
     # Persist schedule and basic metadata to disk so it can be loaded on refresh
@@ -727,20 +996,15 @@ if st.button("Generate Schedule"):
         'end_date': end_date.isoformat() if isinstance(end_date, (datetime.date, datetime.datetime)) else str(end_date),
         'exam_type': exam_type,
         'day_blocks': day_blocks if day_blocks else {},
-        'special_blocks': {d.isoformat(): b for d, b in special_blocks.items()} if special_blocks else {},
-        'special_date_session_blocks': {d.isoformat(): session_config for d, session_config in special_date_session_blocks.items()} if special_date_session_blocks else {}
+        # date keys are serialized to ISO strings by _dump_json
+        'special_blocks': special_blocks if special_blocks else {},
+        'special_date_session_blocks': special_date_session_blocks if special_date_session_blocks else {}
     }
-    save_schedule_state(schedule_df, meta)
-    # Mark session as freshly generated (so badge shows)
+    # Mark session as freshly generated (so badge shows); stamp meta before the single save
     st.session_state['schedule_loaded_from'] = 'generated'
     st.session_state['schedule_loaded_timestamp'] = datetime.datetime.now().isoformat()
     meta['generated_at'] = st.session_state['schedule_loaded_timestamp']
-    # update saved meta with timestamp
-    try:
-        with open('schedule_meta.json', 'w', encoding='utf-8') as mf:
-            json.dump(meta, mf, ensure_ascii=False)
-    except Exception:
-        pass
+    save_schedule_state(schedule_df, meta)
     st.success("Schedule generated with day and session-wise block configuration and cached in session.")
 
 if "schedule_df" in st.session_state:
@@ -752,126 +1016,14 @@ if "schedule_df" in st.session_state:
         st.error("Current schedule is malformed. Please restore a valid schedule (use the Restore tool) or regenerate the schedule.")
     else:
         st.dataframe(preview_df)
-    # Offer Excel download in required horizontal format
-    def schedule_to_excel_bytes(schedule_df):
-        # Defensive: normalize/validate incoming DataFrame schema
-        safe = ensure_schedule_schema(schedule_df)
-        if safe is None:
-            # Caller will display an error; return None to indicate failure
-            return None
-        schedule_df = safe
-        # Build workbook with merged headers using openpyxl for precise formatting
-        from openpyxl import Workbook
-        from openpyxl.styles import Alignment, Font
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Schedule"
-
-        # Header rows
-        ws.merge_cells(start_row=1, start_column=1, end_row=2, end_column=1)  # A1:A2 Sr. No.
-        ws.merge_cells(start_row=1, start_column=2, end_row=2, end_column=2)  # B1:B2 Name
-        ws.merge_cells(start_row=1, start_column=3, end_row=1, end_column=4)  # C1:D1 Date
-        ws.cell(row=1, column=1, value="Sr. No.")
-        ws.cell(row=1, column=2, value="Name of Faculty")
-        ws.cell(row=1, column=3, value="Date")
-        ws.cell(row=2, column=3, value="Morning (10.00 a.m. to 01.00 p.m.)")
-        ws.cell(row=2, column=4, value="Evening (02.00 p.m. to 05.00 p.m.)")
-
-        # Style headers
-        for r in [1, 2]:
-            for c in range(1, 5):
-                cell = ws.cell(row=r, column=c)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                cell.font = Font(bold=True)
-
-        # Fill data grouped by date (date row as merged label, then supervisors)
-        row_idx = 3
-        sr = 1
-        for d in sorted(schedule_df["date"].unique()):
-            # write a date separator row merged across columns A:D
-            ws.merge_cells(start_row=row_idx, start_column=1, end_row=row_idx, end_column=4)
-            ws.cell(row=row_idx, column=1, value=d.strftime("%Y-%m-%d"))
-            ws.cell(row=row_idx, column=1).alignment = Alignment(horizontal="center")
-            ws.cell(row=row_idx, column=1).font = Font(bold=True)
-            row_idx += 1
-
-            morning = schedule_df[(schedule_df["date"] == d) & (schedule_df["session"] == "Morning")]
-            evening = schedule_df[(schedule_df["date"] == d) & (schedule_df["session"] == "Evening")]
-            morning_assigned = morning.iloc[0]["assigned"] if not morning.empty else []
-            evening_assigned = evening.iloc[0]["assigned"] if not evening.empty else []
-            supervisors = sorted(set(morning_assigned + evening_assigned))
-            for name in supervisors:
-                m_tick = "✓" if name in morning_assigned else ""
-                e_tick = "✓" if name in evening_assigned else ""
-                ws.cell(row=row_idx, column=1, value=sr)
-                ws.cell(row=row_idx, column=2, value=name)
-                ws.cell(row=row_idx, column=3, value=m_tick)
-                ws.cell(row=row_idx, column=4, value=e_tick)
-                row_idx += 1
-                sr += 1
-
-        # Auto-width columns
-        for col in ["A", "B", "C", "D"]:
-            ws.column_dimensions[col].width = 25 if col == "B" else 15
-
-        bio = io.BytesIO()
-        wb.save(bio)
-        bio.seek(0)
-        return bio.read()
+    # Offer Excel download in required horizontal format; the exporters are cached on the schedule contents,
+    # so reruns from unrelated widgets reuse the workbook bytes
 
     excel_bytes = schedule_to_excel_bytes(st.session_state["schedule_df"])
     if excel_bytes is not None:
         filename = f"Schedule_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.xlsx"
         st.download_button("Download Schedule (Excel)", data=excel_bytes, file_name=filename, mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="download_schedule_excel")
     # Also provide a horizontal format: rows are supervisors, columns are date-session pairs
-    def schedule_to_excel_horizontal(schedule_df):
-        from openpyxl import Workbook
-        from openpyxl.styles import Alignment, Font
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Schedule_Horizontal"
-
-        # Build list of unique dates
-        dates = sorted(schedule_df["date"].unique())
-        # Header row: Sr. No., Name, then for each date two columns (Morning, Evening)
-        headers = ["Sr. No.", "Name of Faculty"]
-        for d in dates:
-            headers.append(d.strftime("%Y-%m-%d") + "\nMorning")
-            headers.append(d.strftime("%Y-%m-%d") + "\nEvening")
-
-        # Write header
-        for ci, h in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=ci, value=h)
-            cell.alignment = Alignment(wrap_text=True, horizontal="center", vertical="center")
-            cell.font = Font(bold=True)
-
-        # Build list of supervisors
-        names = sorted({n for lst in schedule_df["assigned"].tolist() for n in lst})
-        row_idx = 2
-        sr = 1
-        for name in names:
-            ws.cell(row=row_idx, column=1, value=sr)
-            ws.cell(row=row_idx, column=2, value=name)
-            col = 3
-            for d in dates:
-                morning = schedule_df[(schedule_df["date"] == d) & (schedule_df["session"] == "Morning")]
-                evening = schedule_df[(schedule_df["date"] == d) & (schedule_df["session"] == "Evening")]
-                morning_assigned = morning.iloc[0]["assigned"] if not morning.empty else []
-                evening_assigned = evening.iloc[0]["assigned"] if not evening.empty else []
-                ws.cell(row=row_idx, column=col, value="✓" if name in morning_assigned else "")
-                ws.cell(row=row_idx, column=col+1, value="✓" if name in evening_assigned else "")
-                col += 2
-            row_idx += 1
-            sr += 1
-
-        # Adjust column widths
-        for i in range(1, ws.max_column + 1):
-            ws.column_dimensions[ws.cell(row=1, column=i).column_letter].width = 18
-
-        bio = io.BytesIO()
-        wb.save(bio)
-        bio.seek(0)
-        return bio.read()
 
     # Defensive: ensure schedule has expected schema before generating Excel
     safe_df = ensure_schedule_schema(st.session_state.get("schedule_df"))
@@ -898,12 +1050,11 @@ with col_a:
     default_sign_bytes = None
     if os.path.exists(default_sign_path):
         try:
-            with open(default_sign_path, "rb") as f:
-                default_sign_bytes = f.read()
+            default_sign_bytes = _read_bytes(default_sign_path, os.path.getmtime(default_sign_path))
         except Exception:
             default_sign_bytes = None
     sign_file = st.file_uploader("Signature (sign.jpg) for PDFs (optional)", type=["jpg", "jpeg", "png"], key="sign_pdf")
-    sign_bytes = sign_file.read() if sign_file else default_sign_bytes
+    sign_bytes = _upload_bytes(sign_file, "sign_pdf_bytes") or default_sign_bytes
 with col_b:
     def _select_all():
         st.session_state["selected_supervisors"] = names
@@ -925,18 +1076,7 @@ if st.button("Generate & Download PDF for selected"):
             st.error("No supervisors selected.")
         else:
             # PDF merger availability check
-            def pdf_merger_available():
-                try:
-                    import pypdf  # noqa: F401
-                    return True
-                except Exception:
-                    try:
-                        import PyPDF2  # noqa: F401
-                        return True
-                    except Exception:
-                        return False
-
-            if not pdf_merger_available():
+            if PdfReader is None:
                 st.warning("PDF merging libraries not installed. You can install 'pypdf' or 'PyPDF2' now (recommended: pypdf).")
                 if st.button("Install pypdf"):
                     # Try multiple python executables to accommodate systems where 'pip' is not on PATH
@@ -960,56 +1100,66 @@ if st.button("Generate & Download PDF for selected"):
                         for exe, rc, out in install_output:
                             st.write(f"Attempt with {exe} returned code {rc}. Output:\n{out}")
 
-            for idx, name in enumerate(sel):
+            def _duty_pdf(name, return_page_count=False, assignment_index=None):
                 # Use compatibility wrapper to avoid errors if deployed pdf_utils has fewer optional args
-                pdf_bytes = _call_pdf_compat(generate_duty_pdf, name, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes, uni_logo_bytes, sign_bytes)
-                # Validate PDF has pages before appending
-                valid = True
-                try:
-                    from pypdf import PdfReader
-                    reader = PdfReader(io.BytesIO(pdf_bytes))
-                    if len(reader.pages) == 0:
-                        valid = False
-                except Exception:
-                    # If pypdf not available, assume valid if bytes non-empty
-                    valid = bool(pdf_bytes)
-
-                if not valid:
-                    st.warning(f"Generated PDF for {name} appears empty; skipping in combined output.")
-                    # Still offer individual download so user can inspect
-                    st.download_button(f"Download duty order for {name} (may be empty)", data=pdf_bytes, file_name=f"Duty_{name}.pdf", mime="application/pdf", key=f"download_empty_{idx}_{name}")
-                    continue
+                return _call_pdf_compat(_pdf_utils().generate_duty_pdf, name, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes, uni_logo_bytes, sign_bytes, return_page_count, assignment_index)
 
-                pdfs.append(pdf_bytes)
-                # Offer individual download
-                st.download_button(f"Download duty order for {name}", data=pdf_bytes, file_name=f"Duty_{name}.pdf", mime="application/pdf", key=f"download_{idx}_{name}")
-            # If more than one selected then offer combined single PDF
-            if len(pdfs) > 1:
-                # Prefer direct combined PDF generator (avoids external mergers)
+            # If more than one selected then build the combined PDF first: one ReportLab pass and no re-parse/merge
+            combined = None
+            page_count = None
+            if len(sel) > 1:
                 try:
-                    combined = _call_pdf_compat(generate_combined_duty_pdf, sel, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes, uni_logo_bytes, sign_bytes)
+                    # The generator reports its own page count, so the combined PDF is never re-parsed
+                    combined, page_count = _call_pdf_compat(_pdf_utils().generate_combined_duty_pdf, sel, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes, uni_logo_bytes, sign_bytes, return_page_count=True)
                 except Exception as gen_e:
                     st.warning(f"Direct combined generator failed ({gen_e}), attempting to merge individual PDFs...")
+
+            if combined:
+                # Individual files are only rendered when their download button is clicked
+                for idx, name in enumerate(sel):
+                    st.download_button(f"Download duty order for {name}", data=functools.partial(_duty_pdf, name), file_name=f"Duty_{name}.pdf", mime="application/pdf", key=f"download_{idx}_{name}", on_click="ignore")
+                n_included = len(sel)
+            else:
+                # Each PDF is parsed once; its page count both validates it and adds up to the merged total
+                page_counts = []
+                # ReportLab's compression and buffer I/O release the GIL, so render the PDFs concurrently;
+                # map() keeps the results (and the download buttons) in selection order
+                with ThreadPoolExecutor(max_workers=min(8, len(sel))) as executor:
+                    # The (date, session) -> supervisors index is built once and shared by every supervisor's table
+                    generated = list(executor.map(functools.partial(_duty_pdf, return_page_count=True, assignment_index=_scheduler().build_assignment_index(schedule_df)), sel))
+                for idx, (name, (pdf_bytes, count)) in enumerate(zip(sel, generated)):
+                    # Validate PDF has pages before appending
+                    # If pypdf not available (or the bytes can't be parsed), assume valid if bytes non-empty
+                    valid = count > 0 if count is not None else bool(pdf_bytes)
+
+                    if not valid:
+                        st.warning(f"Generated PDF for {name} appears empty; skipping in combined output.")
+                        # Still offer individual download so user can inspect
+                        st.download_button(f"Download duty order for {name} (may be empty)", data=pdf_bytes, file_name=f"Duty_{name}.pdf", mime="application/pdf", key=f"download_empty_{idx}_{name}")
+                        continue
+
+                    pdfs.append(pdf_bytes)
+                    page_counts.append(count)
+                    # Offer individual download
+                    st.download_button(f"Download duty order for {name}", data=pdf_bytes, file_name=f"Duty_{name}.pdf", mime="application/pdf", key=f"download_{idx}_{name}")
+                # Fallback: merge the individual PDFs
+                if len(pdfs) > 1:
                     try:
-                        combined = combine_pdfs_bytes(pdfs)
+                        combined = _pdf_utils().combine_pdfs_bytes(pdfs)
                     except Exception as e:
                         st.error(f"Failed to combine PDFs: {e}")
                         combined = None
+                n_included = len(pdfs)
+                # Merging keeps every page, so the total is known without re-parsing the merged file
+                if None not in page_counts:
+                    page_count = sum(page_counts)
 
-                if combined:
-                    # Count pages if possible
-                    page_count = None
-                    try:
-                        from pypdf import PdfReader
-                        reader = PdfReader(io.BytesIO(combined))
-                        page_count = len(reader.pages)
-                    except Exception:
-                        page_count = None
-                    st.download_button("Download combined PDF for selected", data=combined, file_name="Combined_Duty_Allotments.pdf", mime="application/pdf", key="download_combined_pdf")
-                    if page_count is not None:
-                        st.info(f"Combined PDF contains {page_count} pages (one or more pages per faculty as required).")
-                        if page_count < len(pdfs):
-                            st.warning(f"Combined PDF page count ({page_count}) is less than the number of included PDFs ({len(pdfs)}). Please inspect individual PDFs.")
+            if combined:
+                st.download_button("Download combined PDF for selected", data=combined, file_name="Combined_Duty_Allotments.pdf", mime="application/pdf", key="download_combined_pdf")
+                if page_count is not None:
+                    st.info(f"Combined PDF contains {page_count} pages (one or more pages per faculty as required).")
+                    if page_count < n_included:
+                        st.warning(f"Combined PDF page count ({page_count}) is less than the number of included PDFs ({n_included}). Please inspect individual PDFs.")
 
 
 st.markdown("---")
@@ -1035,33 +1185,22 @@ if st.button("Send emails to selected"):
             st.error("SMTP not configured. Set credentials in SMTP Configuration or Streamlit secrets or environment variables before sending emails.")
         else:
             schedule_df = st.session_state["schedule_df"]
+            # Collect every message first so they all go out over one SMTP connection
+            outgoing = []
+            assignment_index = _scheduler().build_assignment_index(schedule_df)
             for name in sel:
-                matching = staff_df[staff_df.iloc[:, 1].str.strip() == name]
-                if matching.empty or matching.shape[0] == 0:
-                    st.warning(f"No email for {name}")
-                    continue
-
-                # Robustly find an email-like value in the row
-                row = matching.iloc[0]
-                email = None
-                for val in row.values:
-                    try:
-                        s = str(val)
-                        if "@" in s and "." in s:
-                            email = s.strip()
-                            break
-                    except Exception:
-                        continue
+                email = email_map.get(name)
                 if not email:
                     st.warning(f"No email for {name}")
                     continue
 
-                pdf_bytes = _call_pdf_compat(generate_duty_pdf, name, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes, uni_logo_bytes, None)
-                sent = send_email_with_attachment(email, f"Duty Allotment - {name}", "Please find attached your duty allotment.", pdf_bytes, f"Duty_{name}.pdf")
+                pdf_bytes = _call_pdf_compat(_pdf_utils().generate_duty_pdf, name, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes, uni_logo_bytes, None, assignment_index=assignment_index)
+                outgoing.append((email, f"Duty Allotment - {name}", "Please find attached your duty allotment.", pdf_bytes, f"Duty_{name}.pdf"))
+            for message, sent in zip(outgoing, _email_utils().send_emails_batch(outgoing)):
                 if sent:
-                    st.success(f"Email sent to {email}")
+                    st.success(f"Email sent to {message[0]}")
                 else:
-                    st.error(f"Failed to send to {email}")
+                    st.error(f"Failed to send to {message[0]}")
 
 st.header("Attendance Marking")
 # Small status badge showing whether schedule was loaded or freshly generated
@@ -1090,65 +1229,61 @@ if "schedule_df" in st.session_state:
         st.error("Current schedule is malformed or missing required columns (date/session/assigned). Please restore a valid schedule or regenerate it.")
         st.stop()
     dates = sorted(schedule_df["date"].unique())
+    assigned_map = _assigned_lookup(schedule_df)
     st.write("Mark attendance date-wise and session-wise. Selected = present; unselected = absent.")
     # Load persisted attendance state if present
     if "attendance" not in st.session_state:
         st.session_state["attendance"] = {}
-        if os.path.exists("attendance_state.json"):
-            try:
-                with open("attendance_state.json", "r", encoding="utf-8") as f:
-                    st.session_state["attendance"] = json.load(f)
-            except Exception:
-                st.warning("Unable to load persisted attendance state; starting fresh.")
+        try:
+            st.session_state["attendance"] = _load_att("attendance_state.json", os.path.getmtime("attendance_state.json"))
+        except FileNotFoundError:
+            pass
+        except Exception:
+            st.warning("Unable to load persisted attendance state; starting fresh.")
+
+    # One editable table for every date/session slot instead of a checkbox widget per supervisor per session;
+    # the Present column is prefilled from the saved attendance
+    attendance = st.session_state["attendance"]
+    # Date labels are formatted once per date and shared by the table, the write-back and the per-date buttons
+    date_strs = {d: d.strftime("%Y-%m-%d") for d in dates}
+    att_rows = []
+    for d, date_str in date_strs.items():
+        prev_info = attendance.get(date_str, {})
+        for session in ("Morning", "Evening"):
+            prev_present = set(prev_info.get(f"{session}_present", []))
+            att_rows.extend((date_str, session, name, name in prev_present) for name in sorted(assigned_map.get((d, session), [])))
+    att_df = pd.DataFrame(att_rows, columns=["Date", "Session", "Name", "Present"])
+    # Keyed on the slot layout: ticks survive reruns, but a different schedule starts a fresh editor
+    layout_key = int(pd.util.hash_pandas_object(att_df[["Date", "Session", "Name"]], index=False).sum())
+    edited = st.data_editor(
+        att_df,
+        column_config={"Present": st.column_config.CheckboxColumn("Present")},
+        disabled=["Date", "Session", "Name"],
+        hide_index=True,
+        key=f"attendance_editor_{layout_key}",
+    )
 
-    for d in dates:
-        st.subheader(d.strftime("%Y-%m-%d"))
-        morning = schedule_df[(schedule_df["date"] == d) & (schedule_df["session"] == "Morning")]
-        evening = schedule_df[(schedule_df["date"] == d) & (schedule_df["session"] == "Evening")]
-        morning_assigned = morning.iloc[0]["assigned"] if not morning.empty else []
-        evening_assigned = evening.iloc[0]["assigned"] if not evening.empty else []
-
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("**Morning (10.00 a.m. to 01.00 p.m.)**")
-            present_m = []
-            # show checkbox per assigned supervisor
-            for idx, name in enumerate(sorted(morning_assigned)):
-                safe_key = f"att_{d.strftime('%Y%m%d')}_m_{idx}_{name.replace(' ', '_')}"
-                prev = False
-                prev_info = st.session_state.get("attendance", {}).get(d.strftime("%Y-%m-%d"), {})
-                if prev_info:
-                    prev = name in prev_info.get("Morning_present", [])
-                checked = st.checkbox(name, value=prev, key=safe_key)
-                if checked:
-                    present_m.append(name)
-        with col2:
-            st.markdown("**Evening (02.00 p.m. to 05.00 p.m.)**")
-            present_e = []
-            for idx, name in enumerate(sorted(evening_assigned)):
-                safe_key = f"att_{d.strftime('%Y%m%d')}_e_{idx}_{name.replace(' ', '_')}"
-                prev = False
-                prev_info = st.session_state.get("attendance", {}).get(d.strftime("%Y-%m-%d"), {})
-                if prev_info:
-                    prev = name in prev_info.get("Evening_present", [])
-                checked = st.checkbox(name, value=prev, key=safe_key)
-                if checked:
-                    present_e.append(name)
-
-        # Persist attendance
-        st.session_state["attendance"][d.strftime("%Y-%m-%d")] = {
-            "Morning_present": present_m,
-            "Morning_assigned": morning_assigned,
-            "Evening_present": present_e,
-            "Evening_assigned": evening_assigned,
+    # Write the edited table back into the attendance state in one pass
+    present_by_slot = edited[edited["Present"].astype(bool)].groupby(["Date", "Session"])["Name"].agg(list).to_dict()
+    att_dirty = False
+    for d, date_str in date_strs.items():
+        info = {
+            "Morning_present": present_by_slot.get((date_str, "Morning"), []),
+            "Morning_assigned": assigned_map.get((d, "Morning"), []),
+            "Evening_present": present_by_slot.get((date_str, "Evening"), []),
+            "Evening_assigned": assigned_map.get((d, "Evening"), []),
         }
-        # Auto-save attendance state to disk so refresh won't lose marks
-        save_attendance_state(st.session_state["attendance"])
-
+        if attendance.get(date_str) != info:
+            attendance[date_str] = info
+            att_dirty = True
+    # Auto-save attendance state to disk so refresh won't lose marks, but only on reruns that changed them
+    if att_dirty:
+        save_attendance_state(attendance)
+
+    for d, date_str in date_strs.items():
         # Per-date save + memo generation button
-        save_key = f"save_{d.strftime('%Y%m%d')}"
-        if st.button(f"Save & generate memos for {d.strftime('%Y-%m-%d')}", key=save_key):
-            date_str = d.strftime("%Y-%m-%d")
+        save_key = f"save_{date_str.replace('-', '')}"
+        if st.button(f"Save & generate memos for {date_str}", key=save_key):
             info = st.session_state["attendance"][date_str]
             # write per-date CSV
             per_rows = []
@@ -1164,12 +1299,7 @@ if "schedule_df" in st.session_state:
 
             # Build absentees for this date only
             abs_map_date = {}
-            for name in info["Morning_assigned"]:
-                if name not in info["Morning_present"]:
-                    abs_map_date.setdefault(name, []).append((d, "Morning"))
-            for name in info["Evening_assigned"]:
-                if name not in info["Evening_present"]:
-                    abs_map_date.setdefault(name, []).append((d, "Evening"))
+            _collect_absences(abs_map_date, d, info)
 
             if not abs_map_date:
                 st.success(f"Attendance saved for {date_str}. No absentees found.")
@@ -1182,28 +1312,23 @@ if "schedule_df" in st.session_state:
                 try:
                     uploaded = st.session_state.get("sign_upload")
                     if uploaded:
-                        sign_bytes = uploaded.read()
+                        sign_bytes = _upload_bytes(uploaded, "sign_upload_bytes")
                 except Exception:
                     sign_bytes = None
                 if not sign_bytes:
                     default_sign_path = os.path.join(os.getcwd(), "sign.jpg")
                     if os.path.exists(default_sign_path):
                         try:
-                            with open(default_sign_path, "rb") as f:
-                                sign_bytes = f.read()
+                            sign_bytes = _read_bytes(default_sign_path, os.path.getmtime(default_sign_path))
                         except Exception:
                             sign_bytes = None
 
                 # Generate memo PDFs for absent supervisors for this date and add to absentee_map
                 generated = 0
+                sign_hash = _sign_hash(sign_bytes)
                 for name, absences in abs_map_date.items():
                     st.session_state["absentee_map"].setdefault(name, []).extend(absences)
-                    try:
-                        from pdf_utils import generate_absence_memo
-                        memo_pdf = _call_memo_compat(generate_absence_memo, name, absences, staff_df, None, None, sign_bytes)
-                    except Exception:
-                        pdf_mod = importlib.import_module("pdf_utils")
-                        memo_pdf = _call_memo_compat(pdf_mod.generate_absence_memo, name, absences, staff_df, None, None, sign_bytes)
+                    memo_pdf = _memo_pdf(name, absences, staff_df, sign_bytes, sign_hash)
 
                     # Save memo to file if possible and provide a download
                     fname = f"Memo_{name.replace(' ', '_')}_{date_str}.pdf"
@@ -1227,24 +1352,17 @@ if "schedule_df" in st.session_state:
                 rows.append({"Date": date_str, "Session": "Morning", "Name": name, "Present": (name in info["Morning_present"])})
             for name in info["Evening_assigned"]:
                 rows.append({"Date": date_str, "Session": "Evening", "Name": name, "Present": (name in info["Evening_present"])})
-        df_att = pd.DataFrame(rows)
+        df_att = pd.DataFrame(rows, columns=["Date", "Session", "Name", "Present"])
         df_att.to_csv("attendance_detailed.csv", index=False)
-        # Also write per-date CSVs
-        for date_str, info in st.session_state["attendance"].items():
-            per_rows = []
-            for name in info["Morning_assigned"]:
-                per_rows.append({"Date": date_str, "Session": "Morning", "Name": name, "Present": (name in info["Morning_present"])})
-            for name in info["Evening_assigned"]:
-                per_rows.append({"Date": date_str, "Session": "Evening", "Name": name, "Present": (name in info["Evening_present"])})
-            per_df = pd.DataFrame(per_rows)
+        # Also write per-date CSVs, split from the same frame rather than rebuilt per date
+        for date_str, per_df in df_att.groupby("Date", sort=False):
             per_df.to_csv(f"attendance_{date_str}.csv", index=False)
         # Persist attendance state JSON as well
         save_attendance_state(st.session_state["attendance"])
         st.success("Attendance saved to attendance_detailed.csv and per-date files (attendance_YYYY-MM-DD.csv)")
         # Also provide an explicit download backup of current attendance state
         try:
-            with open('attendance_state.json', 'rb') as f:
-                b = f.read()
+            b = _read_bytes('attendance_state.json', os.path.getmtime('attendance_state.json'))
             st.sidebar.download_button('Download attendance backup (JSON)', data=b, file_name='attendance_state.json', mime='application/json')
         except Exception:
             pass
@@ -1252,15 +1370,24 @@ if "schedule_df" in st.session_state:
     # Provide consolidated download (horizontal) with date-session columns
     if 'attendance' in st.session_state and st.session_state['attendance']:
         def consolidated_attendance_excel_bytes(att_map):
-            from openpyxl import Workbook
-            from openpyxl.styles import Alignment, Font
-            wb = Workbook()
-            ws = wb.active
-            ws.title = 'Consolidated Attendance'
-
-            # Collect all dates and names
+            # Collect all dates and names; union() takes the lists directly, with no per-date sets or concatenation
             dates = sorted(att_map.keys())
-            names = sorted({n for info in att_map.values() for n in info['Morning_assigned'] + info['Evening_assigned']})
+            names = sorted(set().union(
+                *(info.get('Morning_assigned', ()) for info in att_map.values()),
+                *(info.get('Evening_assigned', ()) for info in att_map.values()),
+            ))
+
+            # names x (date, session) grids of assigned / present flags, one column per header slot
+            name_arr = np.array(names, dtype=object)
+            assigned = np.zeros((len(names), 2 * len(dates)), dtype=bool)
+            present = np.zeros_like(assigned)
+            for j, (d, sess) in enumerate((d, sess) for d in dates for sess in ('Morning', 'Evening')):
+                assigned[:, j] = np.isin(name_arr, list(att_map[d].get(f'{sess}_assigned', ())))
+                present[:, j] = np.isin(name_arr, list(att_map[d].get(f'{sess}_present', ())))
+            present &= assigned
+            marks = np.where(assigned, np.where(present, 'P', 'A'), '')
+            total_assigned = assigned.sum(axis=1)
+            total_present = present.sum(axis=1)
 
             # Header
             headers = ['Name']
@@ -1268,52 +1395,20 @@ if "schedule_df" in st.session_state:
                 headers.append(f"{d} Morning")
                 headers.append(f"{d} Evening")
             headers.extend(['Total Assigned', 'Total Present', 'Total Absent'])
-            for ci, h in enumerate(headers, start=1):
-                cell = ws.cell(row=1, column=ci, value=h)
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+            # constant_memory: each row is flushed as soon as the next one starts
+            bio = io.BytesIO()
+            wb = xlsxwriter.Workbook(bio, {'in_memory': True, 'constant_memory': True})
+            ws = wb.add_worksheet('Consolidated Attendance')
+            ws.set_column(0, len(headers) - 1, 18)
+            ws.write_row(0, 0, headers, wb.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'text_wrap': True}))
 
             # Rows per name
-            for ri, name in enumerate(names, start=2):
-                ws.cell(row=ri, column=1, value=name)
-                total_assigned = 0
-                total_present = 0
-                col = 2
-                for d in dates:
-                    info = att_map.get(d, {})
-                    m_assigned = name in info.get('Morning_assigned', [])
-                    e_assigned = name in info.get('Evening_assigned', [])
-                    if m_assigned:
-                        total_assigned += 1
-                        present = name in info.get('Morning_present', [])
-                        if present:
-                            total_present += 1
-                        ws.cell(row=ri, column=col, value='P' if present else 'A')
-                    else:
-                        ws.cell(row=ri, column=col, value='')
-                    col += 1
-                    if e_assigned:
-                        total_assigned += 1
-                        present = name in info.get('Evening_present', [])
-                        if present:
-                            total_present += 1
-                        ws.cell(row=ri, column=col, value='P' if present else 'A')
-                    else:
-                        ws.cell(row=ri, column=col, value='')
-                    col += 1
-
-                ws.cell(row=ri, column=col, value=total_assigned)
-                ws.cell(row=ri, column=col+1, value=total_present)
-                ws.cell(row=ri, column=col+2, value=(total_assigned - total_present))
-
-            # Auto width
-            for i in range(1, ws.max_column+1):
-                ws.column_dimensions[ws.cell(row=1, column=i).column_letter].width = 18
+            for ri, (name, row_marks, n_assigned, n_present) in enumerate(zip(names, marks.tolist(), total_assigned.tolist(), total_present.tolist()), start=1):
+                ws.write_row(ri, 0, [name, *row_marks, n_assigned, n_present, n_assigned - n_present])
 
-            bio = io.BytesIO()
-            wb.save(bio)
-            bio.seek(0)
-            return bio.read()
+            wb.close()
+            return bio.getvalue()
 
         consolidated_bytes = consolidated_attendance_excel_bytes(st.session_state['attendance'])
         st.download_button("Download consolidated attendance (Excel)", data=consolidated_bytes, file_name="Consolidated_Attendance.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="download_consolidated_attendance")
@@ -1321,19 +1416,13 @@ if "schedule_df" in st.session_state:
     st.subheader("Absence Memos")
     memo_subject = st.text_input("Memo email subject", value=st.session_state.get("memo_subject", "Absence from invigilation duty"))
     sign_file = st.file_uploader("Signature image (optional, used in memo and duty PDF)", type=["png","jpg","jpeg"], key="sign_upload")
-    sign_bytes = sign_file.read() if sign_file else None
+    sign_bytes = _upload_bytes(sign_file, "sign_upload_bytes")
 
     if st.button("Generate memos for absentees"):
         # Build list of absentees per supervisor
         absentee_map = {}
         for date_str, info in st.session_state["attendance"].items():
-            d = datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
-            for name in info["Morning_assigned"]:
-                if name not in info["Morning_present"]:
-                    absentee_map.setdefault(name, []).append((d, "Morning"))
-            for name in info["Evening_assigned"]:
-                if name not in info["Evening_present"]:
-                    absentee_map.setdefault(name, []).append((d, "Evening"))
+            _collect_absences(absentee_map, datetime.date.fromisoformat(date_str), info)
 
         if not absentee_map:
             st.success("No absentees found.")
@@ -1343,49 +1432,29 @@ if "schedule_df" in st.session_state:
 
     # If memos exist, show downloads and email option
     if "absentee_map" in st.session_state:
+        # Memos are cached per (name, absences, signature) and only built when their download button is clicked,
+        # so reruns (e.g. changing the email selection) render the buttons without touching ReportLab
+        sign_hash = _sign_hash(sign_bytes)
         for name, absences in st.session_state["absentee_map"].items():
-            memo_pdf = None
-            try:
-                pdf_mod = importlib.import_module("pdf_utils")
-                memo_pdf = _call_memo_compat(pdf_mod.generate_absence_memo, name, absences, staff_df, None, None, sign_bytes)
-            except Exception:
-                try:
-                    from pdf_utils import generate_absence_memo
-                    memo_pdf = _call_memo_compat(generate_absence_memo, name, absences, staff_df, None, None, sign_bytes)
-                except Exception:
-                    memo_pdf = None
-            st.download_button(f"Download memo for {name}", data=memo_pdf, file_name=f"Memo_{name}.pdf", mime="application/pdf", key=f"download_bulk_memo_{name.replace(' ', '_')}")
+            st.download_button(f"Download memo for {name}", data=functools.partial(_memo_pdf, name, absences, staff_df, sign_bytes, sign_hash), file_name=f"Memo_{name}.pdf", mime="application/pdf", key=f"download_bulk_memo_{name.replace(' ', '_')}", on_click="ignore")
 
         memo_send_emails = st.multiselect("Select absentees to email memos", options=list(st.session_state["absentee_map"].keys()))
         memo_subject_input = st.text_input("Memo email subject (for sending)", value=memo_subject)
         if st.button("Send memo emails to selected"):
+            # Collect every memo first so they all go out over one SMTP connection
+            outgoing = []
             for name in memo_send_emails:
-                # find email
-                matching = staff_df[staff_df.iloc[:,1].str.strip()==name]
-                if matching.empty:
-                    st.warning(f"No email for {name}")
-                    continue
-                # find email in row
-                row = matching.iloc[0]
-                email = None
-                for val in row.values:
-                    try:
-                        s = str(val)
-                        if "@" in s and "." in s:
-                            email = s.strip()
-                            break
-                    except Exception:
-                        continue
+                email = email_map.get(name)
                 if not email:
                     st.warning(f"No email for {name}")
                     continue
                 # generate memo pdf bytes
-                pdf_mod = importlib.import_module("pdf_utils")
-                memo_pdf = _call_memo_compat(pdf_mod.generate_absence_memo, name, st.session_state["absentee_map"][name], staff_df, None, None, sign_bytes)
-                sent = send_email_with_attachment(email, memo_subject_input, "Please find attached your absence memo.", memo_pdf, f"Memo_{name}.pdf")
+                memo_pdf = _memo_pdf(name, st.session_state["absentee_map"][name], staff_df, sign_bytes, sign_hash)
+                outgoing.append((email, memo_subject_input, "Please find attached your absence memo.", memo_pdf, f"Memo_{name}.pdf"))
+            for message, sent in zip(outgoing, _email_utils().send_emails_batch(outgoing)):
                 if sent:
-                    st.success(f"Memo sent to {email}")
+                    st.success(f"Memo sent to {message[0]}")
                 else:
-                    st.error(f"Failed to send memo to {email}")
+                    st.error(f"Failed to send memo to {message[0]}")
 else:
     st.info("Generate schedule to mark attendance")
@@ -1,9 +1,15 @@
 import smtplib
 from email.message import EmailMessage
 import os
+import atexit
+import weakref
 import streamlit as st
 
-def send_email_with_attachment(to_email: str, subject: str, body: str, attachment_bytes: bytes, filename: str) -> bool:
+# Pooled connections still open, closed politely when the server process exits
+_open_connections = weakref.WeakSet()
+
+def _smtp_settings():
+    """Return (server, port, user, password), or None after reporting an error if credentials are missing."""
     # Read SMTP config from Streamlit secrets or environment variables
     smtp_server = None
     smtp_port = None
@@ -28,21 +34,94 @@ def send_email_with_attachment(to_email: str, subject: str, body: str, attachmen
 
     if not smtp_server or not user or not password:
         st.error("SMTP credentials not configured. Set Streamlit secrets, environment variables, or provide them in the SMTP Configuration panel.")
-        return False
+        return None
+    return smtp_server, smtp_port, user, password
+
+
+def _close_smtp(conn) -> None:
+    _open_connections.discard(conn)
+    try:
+        conn.quit()
+    except Exception:
+        pass
+
+
+@atexit.register
+def _close_all_smtp() -> None:
+    for conn in list(_open_connections):
+        _close_smtp(conn)
+
+
+def _get_smtp(settings):
+    """Return a logged-in SMTP connection for settings.
+    The connection is kept in this session's state and reused while the server still answers NOOP,
+    so repeated sends skip the connect, STARTTLS and login round trips.
+    """
+    cached = st.session_state.get("_smtp_conn")
+    if cached is not None:
+        cached_settings, conn = cached
+        if cached_settings == settings:
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except Exception:
+                pass
+        _close_smtp(conn)
+        del st.session_state["_smtp_conn"]
 
+    smtp_server, smtp_port, user, password = settings
+    conn = smtplib.SMTP(smtp_server, smtp_port)
+    try:
+        conn.starttls()
+        conn.login(user, password)
+    except Exception:
+        _close_smtp(conn)
+        raise
+    _open_connections.add(conn)
+    st.session_state["_smtp_conn"] = (settings, conn)
+    return conn
+
+
+def _build_message(sender: str, to_email: str, subject: str, body: str, attachment_bytes: bytes, filename: str) -> EmailMessage:
     msg = EmailMessage()
-    msg["From"] = user
+    msg["From"] = sender
     msg["To"] = to_email
     msg["Subject"] = subject
     msg.set_content(body)
     msg.add_attachment(attachment_bytes, maintype="application", subtype="pdf", filename=filename)
+    return msg
+
+
+def send_email_with_attachment(to_email: str, subject: str, body: str, attachment_bytes: bytes, filename: str) -> bool:
+    return send_emails_batch([(to_email, subject, body, attachment_bytes, filename)])[0]
+
+
+def send_emails_batch(messages: list) -> list:
+    """Send (to_email, subject, body, attachment_bytes, filename) tuples over the session's SMTP connection.
+    The TLS handshake and login happen at most once for the whole batch. Returns one bool per message; a failed
+    message does not stop the others, but the rest are skipped if the server drops the connection.
+    """
+    results = [False] * len(messages)
+    if not messages:
+        return results
+    settings = _smtp_settings()
+    if settings is None:
+        return results
+    user = settings[2]
 
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as smtp:
-            smtp.starttls()
-            smtp.login(user, password)
-            smtp.send_message(msg)
-        return True
+        smtp = _get_smtp(settings)
+        for i, (to_email, subject, body, attachment_bytes, filename) in enumerate(messages):
+            try:
+                smtp.send_message(_build_message(user, to_email, subject, body, attachment_bytes, filename))
+                results[i] = True
+            except smtplib.SMTPServerDisconnected:
+                # Don't hand this connection out again; the next send reconnects
+                _close_smtp(smtp)
+                st.session_state.pop("_smtp_conn", None)
+                raise
+            except Exception as e:
+                st.error(f"SMTP send to {to_email} failed: {e}")
     except Exception as e:
         st.error(f"SMTP send failed: {e}")
-        return False
+    return results
@@ -3,17 +3,38 @@ from reportlab.lib.units import mm
 from reportlab.lib.utils import ImageReader
 from reportlab.lib import colors
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak, ListFlowable, ListItem
 import io
+import copy
 import datetime
+import functools
 from typing import Optional
-from scheduler import build_supervisor_table
+from scheduler import build_supervisor_table, build_all_supervisor_tables
+
+_WINTER_MONTHS = frozenset({10, 11, 12, 1})
 
 def _is_winter(month: int) -> bool:
     # winter: Oct-Jan (10-1), summer: Mar-Jul (3-7)
-    return month in [10,11,12,1]
+    return month in _WINTER_MONTHS
+
+@functools.lru_cache(maxsize=None)
+def _duty_header_html(year: int, winter: bool) -> str:
+    """Centered duty-sheet header; only the season and year vary, so each variant is built once per process."""
+    season = 'Winter' if winter else 'Summer'
+    return (
+        '<font size="10"><b>V. V. P. INSTITUTE OF ENGINEERING AND TECHNOLOGY,</b></font><br/>'
+        '<font size="10"><b>SOLAPUR</b></font><br/>'
+        '<font size="9"><b>Dr. BABASAHEB AMBEDKAR TECHNOLOGICAL UNIVERSITY,</b></font><br/>'
+        '<font size="9"><b>LONERE</b></font><br/>'
+        f'<font size="9">{season} Exam Regular And Supplementary ({year})</font><br/>'
+        '<font size="12"><b>DUTY ALLOTMENT SHEET</b></font>'
+    )
 
-def generate_duty_pdf(supervisor_name: str, schedule_df, staff_df, start_date, end_date, exam_type: str, college_logo_bytes: Optional[bytes]=None, uni_logo_bytes: Optional[bytes]=None, sign_bytes: Optional[bytes]=None) -> bytes:
+def generate_duty_pdf(supervisor_name: str, schedule_df, staff_df, start_date, end_date, exam_type: str, college_logo_bytes: Optional[bytes]=None, uni_logo_bytes: Optional[bytes]=None, sign_bytes: Optional[bytes]=None, return_page_count: bool=False, assignment_index: Optional[dict]=None):
+    """Build the duty allotment PDF for one supervisor.
+    Returns the PDF bytes, or (bytes, page_count) when return_page_count is set so callers need not re-parse the PDF.
+    Callers rendering many supervisors can pass a shared scheduler.build_assignment_index result as assignment_index.
+    """
     buf = io.BytesIO()
     # Use platypus SimpleDocTemplate so text and tables flow across A4 pages correctly
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=40, bottomMargin=40)
@@ -40,17 +61,10 @@ def generate_duty_pdf(supervisor_name: str, schedule_df, staff_df, start_date, e
     except Exception:
         right_img = None
 
+    # The date is read per call (the app runs for days), but the header text is cached per season and year
     now = datetime.date.today()
-    season = 'Winter' if _is_winter(now.month) else 'Summer'
     # Header with smaller institute/university font sizes and a slightly larger title
-    center_html = (
-        '<font size="10"><b>V. V. P. INSTITUTE OF ENGINEERING AND TECHNOLOGY,</b></font><br/>'
-        '<font size="10"><b>SOLAPUR</b></font><br/>'
-        '<font size="9"><b>Dr. BABASAHEB AMBEDKAR TECHNOLOGICAL UNIVERSITY,</b></font><br/>'
-        '<font size="9"><b>LONERE</b></font><br/>'
-        f'<font size="9">{season} Exam Regular And Supplementary ({now.year})</font><br/>'
-        '<font size="12"><b>DUTY ALLOTMENT SHEET</b></font>'
-    )
+    center_html = _duty_header_html(now.year, _is_winter(now.month))
     center_para = Paragraph(center_html, ParagraphStyle('center', parent=getSampleStyleSheet()['Normal'], alignment=1, leading=18))
 
     # Build a table for header to place left logo, centered text, right logo
@@ -79,7 +93,7 @@ def generate_duty_pdf(supervisor_name: str, schedule_df, staff_df, start_date, e
     story.append(Spacer(1, 12))
 
     # Supervisor table
-    table_df = build_supervisor_table(supervisor_name, schedule_df)
+    table_df = build_supervisor_table(supervisor_name, schedule_df, assignment_index)
     if table_df.empty:
         story.append(Paragraph('No duties assigned.', normal))
     else:
@@ -116,9 +130,9 @@ def generate_duty_pdf(supervisor_name: str, schedule_df, staff_df, start_date, e
         '10. Invigilators/supervisor should not give any kind of explanation or interpretation to students in connection with the question paper.',
         '11. Students should not be allowed to leave exam hall within half an hour after commencement of examination.'
     ]
-    for li in instr_lines:
-        story.append(Paragraph(li, normal))
-        story.append(Spacer(1, 6))
+    # spaceAfter spaces the lines within paragraph layout instead of a Spacer flowable after each one
+    instr_style = ParagraphStyle('instr', parent=normal, spaceAfter=6)
+    story.extend(Paragraph(li, instr_style) for li in instr_lines)
 
     # Signature (image if provided)
     story.append(Spacer(1, 24))
@@ -137,49 +151,66 @@ def generate_duty_pdf(supervisor_name: str, schedule_df, staff_df, start_date, e
     # Build document
     doc.build(story)
     buf.seek(0)
+    if return_page_count:
+        # doc.page is the number of the last page laid out
+        return buf.read(), doc.page
     return buf.read()
 
 
-def _build_story_for_supervisor(supervisor_name: str, schedule_df, staff_df, start_date, end_date, exam_type: str, college_logo_bytes: Optional[bytes]=None, uni_logo_bytes: Optional[bytes]=None, sign_bytes: Optional[bytes]=None):
-    """Return a list of flowables for a single supervisor's duty order (without building the PDF)."""
+def _shared_story_parts(college_logo_bytes: Optional[bytes]=None, uni_logo_bytes: Optional[bytes]=None, sign_bytes: Optional[bytes]=None) -> dict:
+    """Styles, header/instruction paragraphs and decoded images that are identical on every duty order.
+    Built once per combined PDF. These are templates: the document build marks flowables it has laid out,
+    so each story places a shallow copy, which still shares the parsed text and decoded image data.
+    """
     styles = getSampleStyleSheet()
     normal = ParagraphStyle('Normal', parent=styles['Normal'], fontName='Helvetica', fontSize=10, leading=15)
+    # Instruction lines are spaced by spaceAfter rather than a Spacer flowable after each one
+    instr_style = ParagraphStyle('instr', parent=normal, spaceAfter=6)
 
-    story = []
-
-    # Header
-    left_img = None
-    right_img = None
-    try:
-        if college_logo_bytes:
-            left_img = Image(io.BytesIO(college_logo_bytes), width=40*mm, height=40*mm)
-    except Exception:
-        left_img = None
-    try:
-        if uni_logo_bytes:
-            right_img = Image(io.BytesIO(uni_logo_bytes), width=40*mm, height=40*mm)
-    except Exception:
-        right_img = None
+    def _image(data, width, height):
+        # Image decodes the bytes once here; copies draw the same decoded image
+        try:
+            return Image(io.BytesIO(data), width=width, height=height) if data else None
+        except Exception:
+            return None
 
     now = datetime.date.today()
-    season = 'Winter' if _is_winter(now.month) else 'Summer'
-    center_html = (
-        '<font size="10"><b>V. V. P. INSTITUTE OF ENGINEERING AND TECHNOLOGY,</b></font><br/>'
-        '<font size="10"><b>SOLAPUR</b></font><br/>'
-        '<font size="9"><b>Dr. BABASAHEB AMBEDKAR TECHNOLOGICAL UNIVERSITY,</b></font><br/>'
-        '<font size="9"><b>LONERE</b></font><br/>'
-        f'<font size="9">{season} Exam Regular And Supplementary ({now.year})</font><br/>'
-        '<font size="12"><b>DUTY ALLOTMENT SHEET</b></font>'
-    )
-    center_para = Paragraph(center_html, ParagraphStyle('center', parent=getSampleStyleSheet()['Normal'], alignment=1, leading=18))
-
-    header_data = [[left_img if left_img else '', center_para, right_img if right_img else '']]
+    center_html = _duty_header_html(now.year, _is_winter(now.month))
+    instr_lines = ['<b>INSTRUCTIONS TO INVIGILATORS/SUPERVISOR</b>', 'All the Invigilators/supervisor are informed to observe following points strictly.', '01. Report exam office 30 min. prior to starting time of examination.', '02. No substitute arrangements be done without principal/Office In charge permission.', '03. Check the identity card and Exam fee receipt/hall ticket during every examination.', '04. All the books, note books and any other material brought by the students should be kept outside the hall.', '05. Students are not allowed to communicate with other students, exchange the calculators or any other material during examination period.', '06. Programmable calculators are not allowed.', '07. Students are not allowed to use colored pencil/pen and make any objectionable marks on the answer sheet.', '08. Student should not write anything on question paper.', '09. Invigilators/supervisor shall make two copies of their report for each paper of two sections. For composite blocks Jr. Supervisors should give separate report for every paper. Also the O/C has to be separate for every paper.', '10. Invigilators/supervisor should not give any kind of explanation or interpretation to students in connection with the question paper.', '11. Students should not be allowed to leave exam hall within half an hour after commencement of examination.']
+    return {
+        'normal': normal,
+        'left_img': _image(college_logo_bytes, 40*mm, 40*mm),
+        'right_img': _image(uni_logo_bytes, 40*mm, 40*mm),
+        'sig_img': _image(sign_bytes, 40*mm, 20*mm),
+        'center_para': Paragraph(center_html, ParagraphStyle('center', parent=styles['Normal'], alignment=1, leading=18)),
+        'date_para': Paragraph(now.strftime('%Y-%m-%d'), ParagraphStyle('Right', parent=styles['Normal'], alignment=2, fontSize=9)),
+        'table_header': [Paragraph('<b>Sr. No.</b>', normal), Paragraph('<b>Date</b>', normal), Paragraph('<b>Morning (10.00 a.m. to 01.00 p.m.)</b>', normal), Paragraph('<b>Evening (02.00 p.m. to 05.00 p.m.)</b>', normal)],
+        'no_duties': Paragraph('No duties assigned.', normal),
+        'instr_paragraphs': [Paragraph(li, instr_style) for li in instr_lines],
+        'sig_lines': [Paragraph('Office In charge', ParagraphStyle('sig', parent=styles['Normal'], alignment=2)), Paragraph('VVPIET CENTER, SOLAPUR', ParagraphStyle('sig2', parent=styles['Normal'], alignment=2))],
+    }
+
+
+def _build_story_for_supervisor(supervisor_name: str, schedule_df, staff_df, start_date, end_date, exam_type: str, college_logo_bytes: Optional[bytes]=None, uni_logo_bytes: Optional[bytes]=None, sign_bytes: Optional[bytes]=None, shared: Optional[dict]=None, table_df=None):
+    """Return a list of flowables for a single supervisor's duty order (without building the PDF).
+    Pass shared (from _shared_story_parts) to reuse the common parts across supervisors; the image bytes are then ignored.
+    table_df is the supervisor's build_supervisor_table result when already computed.
+    """
+    if shared is None:
+        shared = _shared_story_parts(college_logo_bytes, uni_logo_bytes, sign_bytes)
+    normal = shared['normal']
+    fresh = copy.copy
     width, _ = A4
+
+    story = []
+
+    # Header
+    header_data = [[fresh(shared['left_img']) if shared['left_img'] else '', fresh(shared['center_para']), fresh(shared['right_img']) if shared['right_img'] else '']]
     header_tbl = Table(header_data, colWidths=[40*mm, (width-80*mm), 40*mm])
     header_tbl.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('ALIGN', (1,0), (1,0), 'CENTER')]))
     story.append(header_tbl)
     story.append(Spacer(1, 6))
-    story.append(Paragraph(now.strftime('%Y-%m-%d'), ParagraphStyle('Right', parent=styles['Normal'], alignment=2, fontSize=9)))
+    story.append(fresh(shared['date_para']))
     story.append(Spacer(1, 10))
 
     # Salutation
@@ -193,11 +224,12 @@ def _build_story_for_supervisor(supervisor_name: str, schedule_df, staff_df, sta
     story.append(Spacer(1, 12))
 
     # Supervisor table
-    table_df = build_supervisor_table(supervisor_name, schedule_df)
+    if table_df is None:
+        table_df = build_supervisor_table(supervisor_name, schedule_df)
     if table_df.empty:
-        story.append(Paragraph('No duties assigned.', normal))
+        story.append(fresh(shared['no_duties']))
     else:
-        data = [[Paragraph('<b>Sr. No.</b>', normal), Paragraph('<b>Date</b>', normal), Paragraph('<b>Morning (10.00 a.m. to 01.00 p.m.)</b>', normal), Paragraph('<b>Evening (02.00 p.m. to 05.00 p.m.)</b>', normal)]]
+        data = [[fresh(p) for p in shared['table_header']]]
         for i, row in table_df.iterrows():
             m_cell = Paragraph(row["Morning"] or '', normal)
             e_cell = Paragraph(row["Evening"] or '', normal)
@@ -209,24 +241,16 @@ def _build_story_for_supervisor(supervisor_name: str, schedule_df, staff_df, sta
         story.append(Spacer(1, 12))
 
     # Instructions
-    instr_lines = ['<b>INSTRUCTIONS TO INVIGILATORS/SUPERVISOR</b>', 'All the Invigilators/supervisor are informed to observe following points strictly.', '01. Report exam office 30 min. prior to starting time of examination.', '02. No substitute arrangements be done without principal/Office In charge permission.', '03. Check the identity card and Exam fee receipt/hall ticket during every examination.', '04. All the books, note books and any other material brought by the students should be kept outside the hall.', '05. Students are not allowed to communicate with other students, exchange the calculators or any other material during examination period.', '06. Programmable calculators are not allowed.', '07. Students are not allowed to use colored pencil/pen and make any objectionable marks on the answer sheet.', '08. Student should not write anything on question paper.', '09. Invigilators/supervisor shall make two copies of their report for each paper of two sections. For composite blocks Jr. Supervisors should give separate report for every paper. Also the O/C has to be separate for every paper.', '10. Invigilators/supervisor should not give any kind of explanation or interpretation to students in connection with the question paper.', '11. Students should not be allowed to leave exam hall within half an hour after commencement of examination.']
-    for li in instr_lines:
-        story.append(Paragraph(li, normal))
-        story.append(Spacer(1, 6))
+    story.extend(fresh(para) for para in shared['instr_paragraphs'])
 
     # Signature (image if provided)
     story.append(Spacer(1, 24))
-    if sign_bytes:
-        try:
-            sig = Image(io.BytesIO(sign_bytes), width=40*mm, height=20*mm)
-            # Right-align the signature image above the Office In charge lines
-            sig_tbl = Table([["", sig]], colWidths=[width - (40*mm) - 20, 40*mm])
-            sig_tbl.setStyle(TableStyle([('ALIGN', (1,0), (1,0), 'RIGHT'), ('VALIGN', (0,0), (-1,-1), 'MIDDLE')]))
-            story.append(sig_tbl)
-        except Exception:
-            pass
-    story.append(Paragraph('Office In charge', ParagraphStyle('sig', parent=getSampleStyleSheet()['Normal'], alignment=2)))
-    story.append(Paragraph('VVPIET CENTER, SOLAPUR', ParagraphStyle('sig2', parent=getSampleStyleSheet()['Normal'], alignment=2)))
+    if shared['sig_img'] is not None:
+        # Right-align the signature image above the Office In charge lines
+        sig_tbl = Table([["", fresh(shared['sig_img'])]], colWidths=[width - (40*mm) - 20, 40*mm])
+        sig_tbl.setStyle(TableStyle([('ALIGN', (1,0), (1,0), 'RIGHT'), ('VALIGN', (0,0), (-1,-1), 'MIDDLE')]))
+        story.append(sig_tbl)
+    story.extend(fresh(p) for p in shared['sig_lines'])
 
     return story
 
@@ -254,11 +278,15 @@ def generate_absence_memo(supervisor_name: str, absences: list, staff_df, colleg
     story.append(Paragraph(today.strftime('%Y-%m-%d'), ParagraphStyle('date_right', parent=styles['Normal'], alignment=2, fontSize=9)))
     story.append(Spacer(1, 12))
 
-    # Body
-    date_lines = '<br/>'.join([f"- {d.strftime('%Y-%m-%d')} ({s})" for d, s in absences])
-    body = f"To,<br/><b>{supervisor_name}</b><br/><br/>This is to inform you that you were absent for invigilation duty on the following date(s)/session(s):<br/>{date_lines}<br/><br/>You are requested to explain the absence within one day and acknowledge receipt of this memo.<br/><br/>"
-    story.append(Paragraph(body, normal))
-    story.append(Spacer(1, 24))
+    # Body; the absences are a list of short plain paragraphs rather than one long <br/>-joined markup block
+    intro = f"To,<br/><b>{supervisor_name}</b><br/><br/>This is to inform you that you were absent for invigilation duty on the following date(s)/session(s):"
+    story.append(Paragraph(intro, normal))
+    if absences:
+        items = [ListItem(Paragraph(f"{d.isoformat()} ({s})", normal)) for d, s in absences]
+        story.append(ListFlowable(items, bulletType='bullet', start='-', leftIndent=10, bulletFontSize=10))
+    story.append(Spacer(1, 15))
+    story.append(Paragraph("You are requested to explain the absence within one day and acknowledge receipt of this memo.", normal))
+    story.append(Spacer(1, 39))  # the 24pt gap plus the blank line that followed the old body text
 
     # Signature image if provided
     if sign_bytes:
@@ -280,50 +308,51 @@ def generate_absence_memo(supervisor_name: str, absences: list, staff_df, colleg
     return buf.read()
 
 
-def generate_combined_duty_pdf(supervisor_names: list, schedule_df, staff_df, start_date, end_date, exam_type: str, college_logo_bytes: Optional[bytes]=None, uni_logo_bytes: Optional[bytes]=None, sign_bytes: Optional[bytes]=None) -> bytes:
-    """Generate a single combined PDF containing duty orders for all supervisors in supervisor_names (each starts on a new page)."""
+def generate_combined_duty_pdf(supervisor_names: list, schedule_df, staff_df, start_date, end_date, exam_type: str, college_logo_bytes: Optional[bytes]=None, uni_logo_bytes: Optional[bytes]=None, sign_bytes: Optional[bytes]=None, return_page_count: bool=False):
+    """Generate a single combined PDF containing duty orders for all supervisors in supervisor_names (each starts on a new page).
+    Returns (bytes, page_count) when return_page_count is set."""
     buf = io.BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=30, rightMargin=30, topMargin=40, bottomMargin=40)
     story = []
+    # Styles, fixed paragraphs and decoded images are built once and shared by every supervisor's pages
+    shared = _shared_story_parts(college_logo_bytes, uni_logo_bytes, sign_bytes)
+    # One pass over the schedule yields every supervisor's duty table
+    tables = build_all_supervisor_tables(schedule_df, supervisor_names)
     for i, name in enumerate(supervisor_names):
-        story.extend(_build_story_for_supervisor(name, schedule_df, staff_df, start_date, end_date, exam_type, college_logo_bytes, uni_logo_bytes, sign_bytes))
+        story.extend(_build_story_for_supervisor(name, schedule_df, staff_df, start_date, end_date, exam_type, shared=shared, table_df=tables[name]))
         if i < len(supervisor_names) - 1:
             story.append(PageBreak())
     doc.build(story)
     buf.seek(0)
+    if return_page_count:
+        return buf.read(), doc.page
     return buf.read()
 
 def combine_pdfs_bytes(list_of_pdf_bytes: list) -> bytes:
-    # Try pypdf first, then PyPDF2, otherwise raise an informative error
-    merger = None
+    # Use pypdf's PdfWriter (PdfMerger was removed in pypdf 5), then PyPDF2, otherwise raise an informative error.
+    # Only a missing library moves on to the next option; errors while merging are raised to the caller.
     try:
-        from pypdf import PdfMerger
-        merger = PdfMerger()
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        PdfWriter = None
+    if PdfWriter is not None:
+        writer = PdfWriter()
         for b in list_of_pdf_bytes:
-            f = io.BytesIO(b)
-            f.seek(0)
-            merger.append(f)
+            writer.append(PdfReader(io.BytesIO(b)))
         out = io.BytesIO()
-        merger.write(out)
-        merger.close()
+        writer.write(out)
+        writer.close()
         return out.getvalue()
-    except Exception:
-        pass
 
     try:
         # PyPDF2 compatibility
         from PyPDF2 import PdfMerger as PyPdfMerger
-        merger = PyPdfMerger()
-        for b in list_of_pdf_bytes:
-            f = io.BytesIO(b)
-            f.seek(0)
-            merger.append(f)
-        out = io.BytesIO()
-        merger.write(out)
-        merger.close()
-        return out.getvalue()
-    except Exception:
-        pass
-
-    # Last resort: return concatenation of bytes (may not be valid PDF)
-    raise RuntimeError("Unable to combine PDFs: install 'pypdf' or 'PyPDF2' to enable PDF merging (e.g., pip install pypdf).")
+    except ImportError:
+        raise RuntimeError("Unable to combine PDFs: install 'pypdf' or 'PyPDF2' to enable PDF merging (e.g., pip install pypdf).")
+    merger = PyPdfMerger()
+    for b in list_of_pdf_bytes:
+        merger.append(io.BytesIO(b))
+    out = io.BytesIO()
+    merger.write(out)
+    merger.close()
+    return out.getvalue()
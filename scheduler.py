@@ -1,22 +1,72 @@
 import datetime
+import functools
+import heapq
 from typing import List, Dict
+import numpy as np
 import pandas as pd
 
+def _exam_ordinals(start_date, end_date, exclude_weekends, holidays):
+    # Walk proleptic ordinals: one set probe and one modulo per day instead of timedelta adds and weekday() calls
+    holiday_ords = frozenset(h.toordinal() for h in holidays)
+    # When exclude_weekends is True we skip Sundays only (weekday()==6).
+    # Historically we skipped Sat/Sun; updated to skip only Sundays (weekday()==6)
+    # Ordinal 1 (0001-01-01) is a Monday, so Sundays are the ordinals divisible by 7
+    return [o for o in range(start_date.toordinal(), end_date.toordinal() + 1)
+            if not (exclude_weekends and o % 7 == 0) and o not in holiday_ords]
+
 def generate_exam_dates(start_date: datetime.date, end_date: datetime.date, exclude_weekends: bool, holidays: List[datetime.date]) -> List[datetime.date]:
-    dates = []
-    cur = start_date
-    while cur <= end_date:
-        # When exclude_weekends is True we skip Sundays only (weekday()==6).
-        # Historically we skipped Sat/Sun; updated to skip only Sundays (weekday()==6)
-        if exclude_weekends and cur.weekday() == 6:
-            cur += datetime.timedelta(days=1)
-            continue
-        if cur in holidays:
-            cur += datetime.timedelta(days=1)
-            continue
-        dates.append(cur)
-        cur += datetime.timedelta(days=1)
-    return dates
+    return list(map(datetime.date.fromordinal, _exam_ordinals(start_date, end_date, exclude_weekends, holidays)))
+
+def generate_exam_date_ordinals(start_date: datetime.date, end_date: datetime.date, exclude_weekends: bool, holidays: List[datetime.date]) -> np.ndarray:
+    """generate_exam_dates as an int32 array of date.toordinal() values, for vectorized callers;
+    no date objects are created.
+    """
+    return np.array(_exam_ordinals(start_date, end_date, exclude_weekends, holidays), np.int32)
+
+# Map weekday integers to day names
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# The schedule's session column is categorical: one int8 code per row instead of a Python string
+_SESSION_DTYPE = pd.CategoricalDtype(["Morning", "Evening"])
+
+def _session_seat_counts(dates, default_blocks, special_blocks, session_blocks, day_blocks, date_session_blocks):
+    """Resolve the supervisors needed for every (date, session).
+    Precedence, lowest to highest: default_blocks, day_blocks ("week_<iso week>_<Day>" before "<Day>"),
+    session_blocks (only where the day override left the default), special_blocks, date_session_blocks.
+    Returns (date, session, count) tuples in date order, Morning before Evening.
+    """
+    # The nested overrides are flattened once into (key, session) tables, so each slot is a few dict.get calls.
+    # Only dict values carry per-session counts; other keys (e.g. week_number) are ignored as before.
+    day_table = {(key, sess): cfg[sess] for key, cfg in day_blocks.items() if isinstance(cfg, dict) for sess in ("morning", "evening") if sess in cfg}
+    date_session_table = {(d, sess): n for d, cfg in date_session_blocks.items() for sess, n in cfg.items()}
+
+    # isocalendar() is only worth calling when some override is keyed by ISO week
+    has_week_keys = any(isinstance(key, str) and key.startswith("week_") for key, _ in day_table)
+
+    seats = []
+    for d in dates:
+        # Day names and the ISO-week key are only needed when there are day overrides to look up
+        if day_table:
+            day_name = DAY_NAMES[d.weekday()]
+            if has_week_keys:
+                week_day_key = f"week_{d.isocalendar()[1]}_{day_name}"
+        for session, sess in (("Morning", "morning"), ("Evening", "evening")):
+            blocks = default_blocks
+            if day_table:
+                blocks = day_table.get((day_name, sess), blocks)
+                if has_week_keys:
+                    blocks = day_table.get((week_day_key, sess), blocks)
+            # One .get per remaining level; each falls back to the value resolved so far
+            if blocks == default_blocks:
+                blocks = session_blocks.get(sess, blocks)
+            blocks = special_blocks.get(d, blocks)
+            blocks = date_session_table.get((d, sess), blocks)
+
+            extras = 1 if blocks == 1 else 2
+            # If blocks is 0, count should be 0 (no supervisors needed)
+            seats.append((d, session, blocks + extras if blocks > 0 else 0))
+    return seats
+
 
 def generate_schedule(dates: List[datetime.date], default_blocks: int, special_blocks: Dict[datetime.date,int], staff_df: pd.DataFrame, session_blocks: Dict[str, int] = None, day_blocks: Dict[str, Dict[str, int]] = None, date_session_blocks: Dict[datetime.date, Dict[str, int]] = None) -> pd.DataFrame:
     """Generates a schedule DataFrame with columns: date, session (Morning/Evening), assigned (list of supervisors)
@@ -31,127 +81,115 @@ def generate_schedule(dates: List[datetime.date], default_blocks: int, special_b
         session_blocks: Dict mapping "morning" or "evening" -> blocks count (per-session default override)
         day_blocks: Dict mapping day name (e.g., "Monday") -> {"morning": blocks, "evening": blocks} (per-day override)
         date_session_blocks: Dict mapping date -> {"morning": blocks, "evening": blocks} (per-date per-session override, highest priority)
+
+    The last 16 distinct inputs are memoized by content, so regenerating an unchanged configuration
+    only rebuilds the DataFrame (with fresh assigned lists the caller may edit).
     """
-    names = staff_df.iloc[:,1].fillna("Unnamed").tolist()
+    names = _supervisor_names(staff_df)
     if len(names) == 0:
         raise ValueError("No supervisors available")
-    
-    if session_blocks is None:
-        session_blocks = {}
-    if day_blocks is None:
-        day_blocks = {}
-    if date_session_blocks is None:
-        date_session_blocks = {}
-    
-    schedule_rows = []
-    
-    # Map weekday integers to day names
-    day_names = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    
-    # First pass: calculate total supervisors needed for morning and evening
-    morning_total = 0
-    evening_total = 0
-    
-    for d in dates:
-        day_name = day_names[d.weekday()]
-        iso_year, iso_week, iso_weekday = d.isocalendar()
-        
-        for session in ["Morning", "Evening"]:
-            blocks = default_blocks
-            
-            # Apply week+day override if present (format: "week_1_Monday")
-            week_day_key = f"week_{iso_week}_{day_name}"
-            if week_day_key in day_blocks and isinstance(day_blocks[week_day_key], dict) and session.lower() in day_blocks[week_day_key]:
-                blocks = day_blocks[week_day_key][session.lower()]
-            elif day_name in day_blocks and isinstance(day_blocks[day_name], dict) and session.lower() in day_blocks[day_name]:
-                blocks = day_blocks[day_name][session.lower()]
-            
-            if blocks == default_blocks and session_blocks and session.lower() in session_blocks:
-                blocks = session_blocks[session.lower()]
-            
-            if d in special_blocks:
-                blocks = special_blocks[d]
-            
-            if d in date_session_blocks and session.lower() in date_session_blocks[d]:
-                blocks = date_session_blocks[d][session.lower()]
-            
-            extras = 1 if blocks == 1 else 2
-            # If blocks is 0, count should be 0 (no supervisors needed)
-            count = blocks + extras if blocks > 0 else 0
-            
-            if session == "Morning":
-                morning_total += count
-            else:
-                evening_total += count
-    
-    # Second pass: assign supervisors with balanced morning/evening distribution
-    # Track how many times each supervisor is assigned to morning/evening
-    supervisor_morning_count = {name: 0 for name in names}
-    supervisor_evening_count = {name: 0 for name in names}
+
+    try:
+        key = (tuple(dates), default_blocks, _freeze(special_blocks), names, _freeze(session_blocks), _freeze(day_blocks), _freeze(date_session_blocks))
+        hash(key)
+    except TypeError:
+        # An unhashable override value; compute without the cache
+        columns = _schedule_columns(dates, default_blocks, special_blocks or {}, names, session_blocks or {}, day_blocks or {}, date_session_blocks or {})
+    else:
+        columns = _cached_schedule_columns(*key)
+    slot_dates, session_codes, assigned = columns
+    # Built column-wise, so pandas does not have to discover keys and unify dtypes row by row
+    return pd.DataFrame({"date": list(slot_dates), "session": pd.Categorical.from_codes(session_codes.copy(), dtype=_SESSION_DTYPE), "assigned": [list(a) for a in assigned]})
+
+
+def _supervisor_names(staff_df):
+    """Second staff column as a tuple, with missing names as "Unnamed" (the column's fillna, done on the plain list)."""
+    return tuple(v if isinstance(v, str) or not pd.isna(v) else "Unnamed" for v in staff_df.iloc[:, 1].tolist())
+
+
+def _freeze(overrides):
+    """Hashable, order-insensitive form of an override dict (nested dicts included); None counts as empty."""
+    return frozenset((k, _freeze(v) if isinstance(v, dict) else v) for k, v in overrides.items()) if overrides else frozenset()
+
+
+def _thaw(frozen):
+    return {k: _thaw(v) if isinstance(v, frozenset) else v for k, v in frozen}
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_schedule_columns(dates, default_blocks, special_blocks, names, session_blocks, day_blocks, date_session_blocks):
+    return _schedule_columns(dates, default_blocks, _thaw(special_blocks), names, _thaw(session_blocks), _thaw(day_blocks), _thaw(date_session_blocks))
+
+
+def _schedule_columns(dates, default_blocks, special_blocks, names, session_blocks, day_blocks, date_session_blocks):
+    """The assignment behind generate_schedule as (dates, session codes, assigned), immutable enough to cache."""
+    # Assign supervisors with balanced morning/evening distribution
+    # Track how many times each supervisor is assigned to morning/evening (by position in unique_names;
+    # a repeated name is one supervisor, ranked at its first position)
+    unique_names = list(dict.fromkeys(names))
+    session_counts = {"Morning": [0] * len(unique_names), "Evening": [0] * len(unique_names)}
+    # One min-heap per session keyed on (session count, total count, position), so each pick is O(log N)
+    # instead of a scan of every supervisor. All keys start equal, so the position order is already a heap.
+    heaps = {"Morning": [(0, 0, i) for i in range(len(unique_names))], "Evening": [(0, 0, i) for i in range(len(unique_names))]}
+
+    def pick_least_loaded(session):
+        own = session_counts[session]
+        other = session_counts["Evening" if session == "Morning" else "Morning"]
+        heap = heaps[session]
+        while True:
+            key_count, key_total, i = heap[0]
+            # Picks in the other session raise a supervisor's total without touching this heap, so an entry
+            # can be stale; counts only grow, so a stale key is too small and is refreshed when it surfaces
+            if key_count == own[i] and key_total == own[i] + other[i]:
+                own[i] += 1
+                heapq.heapreplace(heap, (own[i], own[i] + other[i], i))
+                return unique_names[i]
+            heapq.heapreplace(heap, (own[i], own[i] + other[i], i))
     
     # Create list of (date, session, blocks_needed) tuples
-    assignments = []
-    for d in dates:
-        day_name = day_names[d.weekday()]
-        iso_year, iso_week, iso_weekday = d.isocalendar()
-        
-        for session in ["Morning", "Evening"]:
-            blocks = default_blocks
-            
-            week_day_key = f"week_{iso_week}_{day_name}"
-            if week_day_key in day_blocks and isinstance(day_blocks[week_day_key], dict) and session.lower() in day_blocks[week_day_key]:
-                blocks = day_blocks[week_day_key][session.lower()]
-            elif day_name in day_blocks and isinstance(day_blocks[day_name], dict) and session.lower() in day_blocks[day_name]:
-                blocks = day_blocks[day_name][session.lower()]
-            
-            if blocks == default_blocks and session_blocks and session.lower() in session_blocks:
-                blocks = session_blocks[session.lower()]
-            
-            if d in special_blocks:
-                blocks = special_blocks[d]
-            
-            if d in date_session_blocks and session.lower() in date_session_blocks[d]:
-                blocks = date_session_blocks[d][session.lower()]
-            
-            extras = 1 if blocks == 1 else 2
-            # If blocks is 0, count should be 0 (no supervisors needed)
-            count = blocks + extras if blocks > 0 else 0
-            
-            assignments.append((d, session, count))
+    assignments = _session_seat_counts(dates, default_blocks, special_blocks, session_blocks, day_blocks, date_session_blocks)
     
     # Assign supervisors using balanced allocation
-    # For each assignment, pick the supervisor with the least assignments in that session
-    for d, session, count in assignments:
-        assigned = []
-        for i in range(count):
-            # Find supervisor with least assignments in this session
-            if session == "Morning":
-                # Sort by morning count, then by evening count (to balance overall)
-                best_supervisor = min(names, key=lambda name: (supervisor_morning_count[name], supervisor_morning_count[name] + supervisor_evening_count[name]))
-                supervisor_morning_count[best_supervisor] += 1
-            else:  # Evening
-                # Sort by evening count, then by morning count (to balance overall)
-                best_supervisor = min(names, key=lambda name: (supervisor_evening_count[name], supervisor_morning_count[name] + supervisor_evening_count[name]))
-                supervisor_evening_count[best_supervisor] += 1
-            
-            assigned.append(best_supervisor)
-        
-        schedule_rows.append({"date": d, "session": session, "assigned": assigned})
-    
-    return pd.DataFrame(schedule_rows)
+    # For each assignment, pick the supervisor with the least assignments in that session,
+    # then least overall (to balance overall)
+    assigned = tuple(tuple(pick_least_loaded(session) for _ in range(count)) for _, session, count in assignments)
+
+    session_codes = np.fromiter((session == "Evening" for _, session, _ in assignments), np.int8, len(assignments))
+    # Each slot is built straight into a tuple: immutable, so cached results can be shared safely
+    return tuple(d for d, _, _ in assignments), session_codes, assigned
 
-def build_supervisor_table(supervisor_name: str, schedule_df: pd.DataFrame) -> pd.DataFrame:
+def build_assignment_index(schedule_df: pd.DataFrame) -> Dict[tuple, frozenset]:
+    """Map each (date, session) to the set of supervisors assigned to it.
+    Build it once and pass it to build_supervisor_table / build_all_supervisor_tables when tabulating many supervisors.
+    """
+    # The first row of each (date, session) holds its assignment
+    slots = schedule_df.drop_duplicates(["date", "session"])
+    return {key: frozenset(assigned) if assigned is not None else frozenset() for key, assigned in zip(zip(slots["date"], slots["session"]), slots["assigned"])}
+
+
+def build_supervisor_table(supervisor_name: str, schedule_df: pd.DataFrame, index: Dict[tuple, frozenset] = None) -> pd.DataFrame:
     """Build per-supervisor table with Sr. No., Date, Morning, Evening (ticks)"""
-    rows = []
-    # Get unique dates
-    dates = sorted(schedule_df["date"].unique())
-    sr = 1
-    for d in dates:
-        morning = schedule_df[(schedule_df["date"]==d) & (schedule_df["session"]=="Morning")]
-        evening = schedule_df[(schedule_df["date"]==d) & (schedule_df["session"]=="Evening")]
-        m_tick = "✓" if supervisor_name in (morning.iloc[0]["assigned"] if not morning.empty else []) else ""
-        e_tick = "✓" if supervisor_name in (evening.iloc[0]["assigned"] if not evening.empty else []) else ""
-        if m_tick or e_tick:
-            rows.append({"Sr. No.": sr, "Date": d.strftime('%Y-%m-%d'), "Morning": m_tick, "Evening": e_tick})
-            sr += 1
-    return pd.DataFrame(rows)
+    # One pass over the (date, session) slots instead of two boolean filters of the whole frame per date
+    return build_all_supervisor_tables(schedule_df, [supervisor_name], index)[supervisor_name]
+
+
+def build_all_supervisor_tables(schedule_df: pd.DataFrame, supervisor_names: List[str], index: Dict[tuple, frozenset] = None) -> Dict[str, pd.DataFrame]:
+    """build_supervisor_table for several supervisors from a single pass over the schedule."""
+    if index is None:
+        index = build_assignment_index(schedule_df)
+    wanted = set(supervisor_names)
+    # Per supervisor: parallel Date / Morning / Evening columns; Sr. No. is filled in at the end
+    cols = {name: ([], [], []) for name in supervisor_names}
+    empty = frozenset()
+    for d in sorted({d for d, _ in index}):
+        morning = index.get((d, "Morning"), empty)
+        evening = index.get((d, "Evening"), empty)
+        date_str = d.strftime('%Y-%m-%d')
+        for name in (morning | evening) & wanted:
+            dates_col, morning_col, evening_col = cols[name]
+            dates_col.append(date_str)
+            morning_col.append("✓" if name in morning else "")
+            evening_col.append("✓" if name in evening else "")
+    # A supervisor with no duties keeps the old column-less empty frame
+    return {name: pd.DataFrame({"Sr. No.": range(1, len(d_col) + 1), "Date": d_col, "Morning": m_col, "Evening": e_col}) if d_col else pd.DataFrame()
+            for name, (d_col, m_col, e_col) in cols.items()}